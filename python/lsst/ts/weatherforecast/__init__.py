@@ -24,5 +24,11 @@ try:
 except ImportError:
     __version__ = "?"
 
+from .archive import *
+from .backfill import *
 from .config_schema import *
 from .csc import *
+from .forecast import *
+from .forecast_server import *
+from .gap_fill import *
+from .profiler import *
@@ -0,0 +1,270 @@
+# This file is part of ts_weatherforecast.
+#
+# Developed for the Vera C. Rubin Observatory Telescope and Site Systems.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+__all__ = ["ForecastArchive"]
+
+import datetime
+import json
+import logging
+import os
+import pathlib
+import shutil
+import tempfile
+
+import numpy as np
+
+TREND_STEPS: dict[str, int] = {"hourly": 3600, "daily": 86400}
+MODELRUN_FORMAT: str = "%Y-%m-%d %H:%M"
+
+
+class ForecastArchive:
+    """Implement a columnar on-disk archive of decoded forecasts.
+
+    Each forecast is stored in its own directory, partitioned by the UTC day
+    and time of the model run::
+
+        <root>/<YYYY-MM-DD>/<HHMM>/metadata.json
+        <root>/<YYYY-MM-DD>/<HHMM>/hourly.npy
+        <root>/<YYYY-MM-DD>/<HHMM>/daily.npy
+
+    Every ``.npy`` file holds one row per field (``time`` first)
+    so that a single memory map serves all fields of a trend.
+
+    Parameters
+    ----------
+    root : `str` or `pathlib.Path`
+        The directory that holds the archive.
+        It is created if it does not exist.
+
+    Attributes
+    ----------
+    root : `pathlib.Path`
+        The directory that holds the archive.
+    """
+
+    def __init__(self, root: str | pathlib.Path) -> None:
+        self.root: pathlib.Path = pathlib.Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.log: logging.Logger = logging.getLogger(__name__)
+
+    @staticmethod
+    def parse_modelrun(modelrun_utc: str) -> datetime.datetime:
+        """Parse the Meteoblue model run string as a UTC datetime.
+
+        Parameters
+        ----------
+        modelrun_utc : `str`
+            The model run time in the ``YYYY-MM-DD hh:mm`` format.
+
+        Returns
+        -------
+        `datetime.datetime`
+            The timezone aware model run time.
+        """
+        return datetime.datetime.strptime(modelrun_utc, MODELRUN_FORMAT).replace(tzinfo=datetime.timezone.utc)
+
+    def get_run_dir(self, modelrun: datetime.datetime) -> pathlib.Path:
+        """Return the partition directory of a model run.
+
+        Parameters
+        ----------
+        modelrun : `datetime.datetime`
+            The UTC model run time.
+
+        Returns
+        -------
+        `pathlib.Path`
+            The directory the model run is (or would be) stored in.
+        """
+        return self.root / modelrun.strftime("%Y-%m-%d") / modelrun.strftime("%H%M")
+
+    def write(
+        self,
+        metadata: dict,
+        hourly: dict[str, list[int | float | None]],
+        daily: dict[str, list[int | float | None]],
+    ) -> pathlib.Path:
+        """Write one decoded forecast to the archive.
+
+        This call blocks on disk I/O; the CSC runs it in a thread.
+        An existing entry for the same model run is replaced; readers see
+        either the old or the new entry, never a partial one.
+
+        Parameters
+        ----------
+        metadata : `dict`
+            The ``metadata`` field of the Meteoblue response.
+        hourly : `dict`
+            The hourly trend, with ``time`` already converted
+            to unix timestamps.
+        daily : `dict`
+            The daily trend, with ``time`` already converted
+            to unix timestamps.
+
+        Returns
+        -------
+        run_dir : `pathlib.Path`
+            The directory the forecast was written to.
+        """
+        modelrun = self.parse_modelrun(metadata["modelrun_utc"])
+        run_dir = self.get_run_dir(modelrun)
+        run_dir.parent.mkdir(parents=True, exist_ok=True)
+        index: dict = {
+            "modelrun": modelrun.timestamp(),
+            "metadata": metadata,
+        }
+        tmp_dir = pathlib.Path(tempfile.mkdtemp(prefix=".tmp-", dir=run_dir.parent))
+        try:
+            for trend, data in (("hourly", hourly), ("daily", daily)):
+                fields = ["time"] + [name for name in data if name != "time"]
+                columns = np.array([data[name] for name in fields], dtype=np.float64)
+                np.save(tmp_dir / f"{trend}.npy", columns)
+                index[f"{trend}_fields"] = fields
+            with open(tmp_dir / "metadata.json", "w") as f:
+                json.dump(index, f)
+            # Move an existing entry aside rather than deleting it first,
+            # so that it is only deleted once the new one is in place.
+            old_dir = tmp_dir.with_name(".old-" + tmp_dir.name.removeprefix(".tmp-"))
+            if run_dir.exists():
+                os.replace(run_dir, old_dir)
+            try:
+                os.replace(tmp_dir, run_dir)
+            except Exception:
+                if old_dir.exists():
+                    os.replace(old_dir, run_dir)
+                raise
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        shutil.rmtree(old_dir, ignore_errors=True)
+        self.log.info(f"Archived forecast for model run {modelrun} in {run_dir}.")
+        return run_dir
+
+    def list_runs(self, start: float, end: float) -> list[pathlib.Path]:
+        """List the archived model runs issued in a time range.
+
+        Parameters
+        ----------
+        start : `float`
+            Start of the range, as a unix timestamp (inclusive).
+        end : `float`
+            End of the range, as a unix timestamp (inclusive).
+
+        Returns
+        -------
+        run_dirs : `list` [`pathlib.Path`]
+            The directories of the matching model runs, in time order.
+            Files and directories that are not named like a partition
+            are ignored.
+        """
+        start_day = datetime.datetime.fromtimestamp(start, tz=datetime.timezone.utc).strftime("%Y-%m-%d")
+        end_day = datetime.datetime.fromtimestamp(end, tz=datetime.timezone.utc).strftime("%Y-%m-%d")
+        run_dirs: list[pathlib.Path] = []
+        for day_dir in sorted(self.root.iterdir()):
+            if not start_day <= day_dir.name <= end_day or not day_dir.is_dir():
+                continue
+            for run_dir in sorted(day_dir.iterdir()):
+                if not run_dir.is_dir():
+                    continue
+                try:
+                    modelrun = datetime.datetime.strptime(
+                        f"{day_dir.name} {run_dir.name}", "%Y-%m-%d %H%M"
+                    ).replace(tzinfo=datetime.timezone.utc)
+                except ValueError:
+                    continue
+                if start <= modelrun.timestamp() <= end:
+                    run_dirs.append(run_dir)
+        return run_dirs
+
+    def query(
+        self,
+        start: float,
+        end: float,
+        lead_min: int = 0,
+        lead_max: int | None = None,
+        fields: list[str] | None = None,
+        trend: str = "hourly",
+    ) -> dict[str, np.ndarray]:
+        """Return all forecasts issued in a time range as arrays.
+
+        The forecasts are aligned on a lead time grid whose step is one hour
+        for the hourly trend and one day for the daily trend.
+        Lead times a model run does not cover are filled with NaN.
+
+        Parameters
+        ----------
+        start : `float`
+            Earliest model run time, as a unix timestamp (inclusive).
+        end : `float`
+            Latest model run time, as a unix timestamp (inclusive).
+        lead_min : `int`
+            First lead time to return, in trend steps.
+        lead_max : `int` or `None`
+            Last lead time to return, in trend steps (inclusive).
+            If `None`, use the longest lead time found.
+        fields : `list` [`str`] or `None`
+            The fields to return. If `None`, return all fields.
+        trend : `str`
+            Either "hourly" or "daily".
+
+        Returns
+        -------
+        result : `dict` [`str`, `numpy.ndarray`]
+            ``modelrun`` holds the N model run timestamps,
+            ``lead`` the M lead times, ``time`` and every requested field
+            an N x M array of values.
+
+        Raises
+        ------
+        ValueError
+            If ``trend`` is not valid or a requested field is unknown.
+        """
+        if trend not in TREND_STEPS:
+            raise ValueError(f"trend must be one of {list(TREND_STEPS)}, not {trend!r}.")
+        step = TREND_STEPS[trend]
+        runs: list[tuple[float, np.ndarray, np.ndarray, list[str]]] = []
+        for run_dir in self.list_runs(start, end):
+            with open(run_dir / "metadata.json") as f:
+                index = json.load(f)
+            columns = np.load(run_dir / f"{trend}.npy", mmap_mode="r")
+            leads = np.floor((columns[0] - index["modelrun"]) / step).astype(np.int64)
+            runs.append((index["modelrun"], leads, columns, index[f"{trend}_fields"]))
+
+        if fields is None:
+            fields = [name for name in runs[0][3] if name != "time"] if runs else []
+        if lead_max is None:
+            lead_max = max((int(leads.max()) for _, leads, _, _ in runs if leads.size), default=lead_min)
+        lead = np.arange(lead_min, lead_max + 1, dtype=np.int64)
+        names = ["time"] + list(fields)
+        result: dict[str, np.ndarray] = {
+            "modelrun": np.array([run[0] for run in runs], dtype=np.float64),
+            "lead": lead,
+        }
+        for name in names:
+            result[name] = np.full((len(runs), lead.size), np.nan)
+        for i, (_, leads, columns, run_fields) in enumerate(runs):
+            keep = (leads >= lead_min) & (leads <= lead_max)
+            positions = leads[keep] - lead_min
+            for name in names:
+                if name not in run_fields:
+                    raise ValueError(f"Unknown {trend} field {name!r}.")
+                result[name][i, positions] = columns[run_fields.index(name)][keep]
+        return result
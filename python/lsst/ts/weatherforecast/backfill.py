@@ -0,0 +1,537 @@
+# This file is part of ts_weatherforecast.
+#
+# Developed for the Vera C. Rubin Observatory Telescope and Site Systems.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+__all__ = ["Backfill", "Site", "execute_backfill"]
+
+import argparse
+import asyncio
+import dataclasses
+import datetime
+import logging
+import os
+import pathlib
+
+import aiohttp
+from lsst.ts import salobj
+
+from .archive import ForecastArchive
+from .forecast import (
+    ELEVATION,
+    LATITUDE,
+    LONGITUDE,
+    REQUEST_URL,
+    SITE_URL,
+    decode_forecast,
+    fetch_forecast,
+    make_telemetry,
+)
+from .gap_fill import fill_forecast_gaps
+
+MODELRUN_FORMAT: str = "%Y-%m-%d %H:%M"
+
+
+@dataclasses.dataclass(frozen=True)
+class Site:
+    """A location to backfill forecasts for.
+
+    Parameters
+    ----------
+    name : `str`
+        The name of the site. Used to partition the archive.
+    latitude : `float`
+        The latitude of the site. (Degrees)
+    longitude : `float`
+        The longitude of the site. (Degrees)
+    elevation : `float`
+        The elevation above sea level of the site. (Meters)
+    """
+
+    name: str
+    latitude: float = LATITUDE
+    longitude: float = LONGITUDE
+    elevation: float = ELEVATION
+
+    @classmethod
+    def from_string(cls, value: str) -> "Site":
+        """Parse a site given as ``NAME=LATITUDE,LONGITUDE,ELEVATION``.
+
+        Parameters
+        ----------
+        value : `str`
+            The site to parse.
+
+        Returns
+        -------
+        `Site`
+            The parsed site.
+
+        Raises
+        ------
+        ValueError
+            If the string does not have the expected format.
+        """
+        name, sep, coordinates = value.partition("=")
+        values = coordinates.split(",")
+        if not name or not sep or len(values) != 3:
+            raise ValueError(f"Site {value!r} is not formatted as NAME=LATITUDE,LONGITUDE,ELEVATION.")
+        return cls(name, float(values[0]), float(values[1]), float(values[2]))
+
+
+class Backfill:
+    """Fetch the forecasts of past model runs.
+
+    Forecasts are fetched concurrently with the same code as the CSC,
+    then written to a `ForecastArchive` (one per site) and/or replayed as
+    telemetry in model run order.
+    The key of every forecast fetched is appended to a progress file,
+    so an interrupted backfill resumes where it stopped.
+
+    The live forecast package only returns the latest model run, so the
+    past runs must come from an archive or history package of your
+    Meteoblue subscription. ``request_url`` is the path of that package
+    and ``modelrun_param`` the URL parameter it uses to select the model
+    run, whose value is formatted as ``YYYY-MM-DD hh:mm`` (UTC).
+    A response whose ``metadata.modelrun_utc`` is not the requested model
+    run is rejected, so a package that ignores the parameter cannot mark
+    gaps as filled.
+
+    Parameters
+    ----------
+    site_url : `str`
+        The base URL of the Meteoblue API.
+    api_key : `str` or `None`
+        The Meteoblue API key.
+    sites : `list` [`Site`]
+        The sites to fetch forecasts for.
+    start : `datetime.datetime`
+        The first model run to fetch (UTC). It must be on the model run
+        grid: 00 UTC plus a multiple of ``interval``.
+    end : `datetime.datetime`
+        The last model run to fetch (UTC, inclusive).
+    progress_file : `str` or `pathlib.Path`
+        The file that records the forecasts already fetched,
+        one key per line.
+    request_url : `str`
+        The path of the archive or history forecast package.
+    modelrun_param : `str`
+        The URL parameter that selects the model run in ``request_url``.
+    archive_dir : `str` or `pathlib.Path` or `None`
+        The root of the archives. If `None`, do not archive.
+    controller : `lsst.ts.salobj.Controller` or `None`
+        A WeatherForecast controller to replay the forecasts with.
+        If `None`, do not replay.
+    interval : `float`
+        The time between model runs. (Hours)
+    max_concurrency : `int`
+        The maximum number of requests in flight.
+    credit_budget : `int` or `None`
+        The maximum number of Meteoblue credits to spend in one `run`.
+        If `None`, there is no limit.
+    credits_per_request : `int`
+        The number of credits spent by one request.
+    gap_fill_max_hours : `int`
+        The longest gap filled in the hourly trend before replay. (Hours)
+    gap_fill_max_days : `int`
+        The longest gap filled in the daily trend before replay. (Days)
+    log : `logging.Logger` or `None`
+        The logger to use. If `None`, create one.
+
+    Attributes
+    ----------
+    done : `set` [`str`]
+        The keys of the forecasts already fetched.
+    credits_used : `int`
+        The number of credits spent by the last `run`.
+    failed : `int`
+        The number of forecasts that could not be fetched, did not match
+        the requested model run, or could not be stored or replayed.
+
+    Raises
+    ------
+    ValueError
+        If there is nothing to write the forecasts to, ``max_concurrency``
+        is not positive, or ``start`` is not on the model run grid.
+    """
+
+    def __init__(
+        self,
+        site_url: str,
+        api_key: str | None,
+        sites: list[Site],
+        start: datetime.datetime,
+        end: datetime.datetime,
+        progress_file: str | pathlib.Path,
+        request_url: str,
+        modelrun_param: str,
+        archive_dir: str | pathlib.Path | None = None,
+        controller: salobj.Controller | None = None,
+        interval: float = 12,
+        max_concurrency: int = 4,
+        credit_budget: int | None = None,
+        credits_per_request: int = 1,
+        gap_fill_max_hours: int = 0,
+        gap_fill_max_days: int = 0,
+        log: logging.Logger | None = None,
+    ) -> None:
+        if archive_dir is None and controller is None:
+            raise ValueError("Specify an archive directory, a controller to replay with, or both.")
+        if max_concurrency < 1:
+            raise ValueError(f"max_concurrency={max_concurrency} must be at least 1.")
+        check_model_run(start, interval)
+        self.site_url: str = site_url
+        self.api_key: str | None = api_key
+        self.sites: list[Site] = sites
+        self.start: datetime.datetime = start
+        self.end: datetime.datetime = end
+        self.progress_file: pathlib.Path = pathlib.Path(progress_file)
+        self.archives: dict[str, ForecastArchive] = (
+            {site.name: ForecastArchive(pathlib.Path(archive_dir) / site.name) for site in sites}
+            if archive_dir is not None
+            else {}
+        )
+        self.controller: salobj.Controller | None = controller
+        self.request_url: str = request_url
+        self.modelrun_param: str = modelrun_param
+        self.interval: datetime.timedelta = datetime.timedelta(hours=interval)
+        self.max_concurrency: int = max_concurrency
+        self.credit_budget: int | None = credit_budget
+        self.credits_per_request: int = credits_per_request
+        self.gap_fill_max_hours: int = gap_fill_max_hours
+        self.gap_fill_max_days: int = gap_fill_max_days
+        self.log: logging.Logger = log if log is not None else logging.getLogger(__name__)
+        self.done: set[str] = set()
+        self.credits_used: int = 0
+        self.failed: int = 0
+
+    @staticmethod
+    def make_key(site: Site, modelrun: datetime.datetime) -> str:
+        """Return the progress key of a forecast."""
+        return f"{site.name}/{modelrun.strftime(MODELRUN_FORMAT)}"
+
+    def model_runs(self) -> list[datetime.datetime]:
+        """Return the model runs to fetch, in time order."""
+        modelruns: list[datetime.datetime] = []
+        modelrun = self.start
+        while modelrun <= self.end:
+            modelruns.append(modelrun)
+            modelrun += self.interval
+        return modelruns
+
+    def load_progress(self) -> None:
+        """Load the keys of the forecasts already fetched, if any."""
+        self.done = set()
+        if not self.progress_file.exists():
+            return
+        with open(self.progress_file, "rb") as f:
+            data = f.read()
+        complete, _, partial = data.rpartition(b"\n")
+        self.done = {line for line in complete.decode().split("\n") if line}
+        if partial:
+            # Drop the end of a line left by an interrupted write,
+            # so that the next key starts on its own line.
+            os.truncate(self.progress_file, len(data) - len(partial))
+
+    def save_progress(self, key: str) -> None:
+        """Append the key of a forecast just fetched to the progress file."""
+        with open(self.progress_file, "a") as f:
+            f.write(f"{key}\n")
+
+    async def run(self) -> int:
+        """Fetch every missing forecast.
+
+        Returns
+        -------
+        fetched : `int`
+            The number of forecasts fetched.
+        """
+        self.load_progress()
+        self.credits_used = 0
+        jobs = [
+            (site, modelrun)
+            for modelrun in self.model_runs()
+            for site in self.sites
+            if self.make_key(site, modelrun) not in self.done
+        ]
+        if self.credit_budget is not None:
+            affordable = self.credit_budget // self.credits_per_request
+            if affordable < len(jobs):
+                self.log.warning(
+                    f"The credit budget only allows {affordable} of {len(jobs)} requests; "
+                    "run again to fetch the rest."
+                )
+                jobs = jobs[:affordable]
+        self.log.info(f"Fetching {len(jobs)} forecasts; {len(self.done)} already done.")
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        fetched = 0
+        async with aiohttp.ClientSession(self.site_url, raise_for_status=True) as session:
+            tasks = [
+                asyncio.create_task(self.fetch_one(session, semaphore, site, modelrun))
+                for site, modelrun in jobs
+            ]
+            try:
+                # Wait for the forecasts in model run order, so that they
+                # are replayed in that order whatever order they arrive in.
+                for (site, modelrun), task in zip(jobs, tasks):
+                    decoded = await task
+                    if decoded is None:
+                        continue
+                    if self.controller is not None:
+                        try:
+                            await self.replay(decoded)
+                        except Exception:
+                            self.log.exception(f"Failed to replay {self.make_key(site, modelrun)}.")
+                            self.failed += 1
+                            continue
+                        self.mark_done(site, modelrun)
+                    fetched += 1
+            finally:
+                for task in tasks:
+                    task.cancel()
+        return fetched
+
+    def mark_done(self, site: Site, modelrun: datetime.datetime) -> None:
+        """Record that a forecast is backfilled and save the progress."""
+        key = self.make_key(site, modelrun)
+        self.done.add(key)
+        self.save_progress(key)
+        self.log.info(f"Backfilled {key}.")
+
+    async def replay(self, decoded: dict[str, dict]) -> None:
+        """Fill the short gaps of a forecast, as the CSC does,
+        and publish it as telemetry.
+
+        Parameters
+        ----------
+        decoded : `dict` [`str`, `dict`]
+            The forecast returned by `decode_forecast`.
+            It is filled in place.
+        """
+        assert self.controller is not None
+        fill_forecast_gaps(decoded, self.gap_fill_max_hours, self.gap_fill_max_days)
+        for topic_name, data in make_telemetry(decoded).items():
+            await getattr(self.controller, f"tel_{topic_name}").set_write(**data)
+
+    async def fetch_one(
+        self,
+        session: aiohttp.ClientSession,
+        semaphore: asyncio.Semaphore,
+        site: Site,
+        modelrun: datetime.datetime,
+    ) -> dict[str, dict] | None:
+        """Fetch, check, decode and archive one forecast.
+
+        Without replay the forecast is marked done once archived;
+        with replay, `run` marks it done once replayed.
+
+        Parameters
+        ----------
+        session : `aiohttp.ClientSession`
+            The session to fetch with.
+        semaphore : `asyncio.Semaphore`
+            Bounds the number of requests in flight.
+        site : `Site`
+            The site of the forecast.
+        modelrun : `datetime.datetime`
+            The model run of the forecast.
+
+        Returns
+        -------
+        decoded : `dict` [`str`, `dict`] or `None`
+            The decoded forecast, or `None` if it failed.
+        """
+        key = self.make_key(site, modelrun)
+        requested = modelrun.strftime(MODELRUN_FORMAT)
+        async with semaphore:
+            self.credits_used += self.credits_per_request
+            try:
+                response = await fetch_forecast(
+                    session,
+                    self.api_key,
+                    latitude=site.latitude,
+                    longitude=site.longitude,
+                    elevation=site.elevation,
+                    request_url=self.request_url,
+                    extra_params={self.modelrun_param: requested},
+                )
+                received = response["metadata"]["modelrun_utc"]
+                if received != requested:
+                    raise RuntimeError(
+                        f"Requested model run {requested} but got {received}; "
+                        f"does {self.request_url} support the {self.modelrun_param!r} parameter?"
+                    )
+                decoded = decode_forecast(response)
+                if site.name in self.archives:
+                    await asyncio.to_thread(
+                        self.archives[site.name].write,
+                        decoded["metadata"],
+                        decoded["trend_1h"],
+                        decoded["trend_day"],
+                    )
+            except Exception:
+                self.log.exception(f"Failed to backfill {key}.")
+                self.failed += 1
+                return None
+        if self.controller is None:
+            self.mark_done(site, modelrun)
+        return decoded
+
+
+def check_model_run(modelrun: datetime.datetime, interval: float) -> None:
+    """Check that a time is on the model run grid.
+
+    Parameters
+    ----------
+    modelrun : `datetime.datetime`
+        The time to check (UTC).
+    interval : `float`
+        The time between model runs, which start at 00 UTC. (Hours)
+
+    Raises
+    ------
+    ValueError
+        If ``modelrun`` is not 00 UTC plus a multiple of ``interval``.
+    """
+    midnight = modelrun.replace(hour=0, minute=0, second=0, microsecond=0)
+    if (modelrun - midnight) % datetime.timedelta(hours=interval):
+        raise ValueError(
+            f"{modelrun} is not a model run time: model runs are every {interval} hours from 00 UTC."
+        )
+
+
+def parse_time(value: str) -> datetime.datetime:
+    """Parse an ISO date or time, assumed to be UTC if naive."""
+    time = datetime.datetime.fromisoformat(value)
+    if time.tzinfo is None:
+        time = time.replace(tzinfo=datetime.timezone.utc)
+    return time.astimezone(datetime.timezone.utc)
+
+
+def parse_end_time(value: str) -> datetime.datetime:
+    """Parse an ISO date or time like `parse_time`, where a date means
+    the end of that day.
+    """
+    time = parse_time(value)
+    try:
+        datetime.date.fromisoformat(value)
+    except ValueError:
+        return time
+    return time + datetime.timedelta(days=1) - datetime.timedelta(microseconds=1)
+
+
+async def amain() -> int:
+    """Parse the command line and run the backfill."""
+    parser = argparse.ArgumentParser(
+        description="Fill gaps in the WeatherForecast data with past Meteoblue forecasts."
+    )
+    parser.add_argument("start", type=parse_time, help="First model run to fetch (ISO format, UTC).")
+    parser.add_argument(
+        "end",
+        type=parse_end_time,
+        help="Last model run to fetch (ISO format, UTC). A date includes every run of that day.",
+    )
+    parser.add_argument(
+        "--site",
+        dest="sites",
+        action="append",
+        type=Site.from_string,
+        help="Site as NAME=LATITUDE,LONGITUDE,ELEVATION; may be repeated. Defaults to the CSC site.",
+    )
+    parser.add_argument("--archive-dir", help="Root directory of the forecast archives.")
+    parser.add_argument("--replay", action="store_true", help="Replay the forecasts as telemetry.")
+    parser.add_argument(
+        "--progress-file",
+        default="weatherforecast-backfill.progress",
+        help="File that records progress, to resume an interrupted backfill.",
+    )
+    parser.add_argument("--site-url", default=SITE_URL, help="Base URL of the Meteoblue API.")
+    parser.add_argument(
+        "--request-url",
+        required=True,
+        help="Path of the Meteoblue archive or history package that serves past model runs. "
+        f"The live package, {REQUEST_URL}, only serves the latest run.",
+    )
+    parser.add_argument(
+        "--modelrun-param",
+        required=True,
+        help="URL parameter of --request-url that selects the model run (value as YYYY-MM-DD hh:mm, UTC). "
+        "Responses for any other model run are rejected.",
+    )
+    parser.add_argument("--interval", type=float, default=12, help="Hours between model runs.")
+    parser.add_argument("--max-concurrency", type=int, default=4, help="Maximum requests in flight.")
+    parser.add_argument(
+        "--credit-budget", type=int, help="Maximum number of Meteoblue credits to spend in this run."
+    )
+    parser.add_argument("--credits-per-request", type=int, default=1, help="Credits spent by one request.")
+    parser.add_argument(
+        "--gap-fill-max-hours",
+        type=int,
+        default=0,
+        help="Longest gap filled in the hourly trend before replay; use the CSC setting. 0 disables.",
+    )
+    parser.add_argument(
+        "--gap-fill-max-days",
+        type=int,
+        default=0,
+        help="Longest gap filled in the daily trend before replay; use the CSC setting. 0 disables.",
+    )
+    args = parser.parse_args()
+    if args.archive_dir is None and not args.replay:
+        parser.error("Specify --archive-dir, --replay, or both.")
+    try:
+        check_model_run(args.start, args.interval)
+    except ValueError as e:
+        parser.error(str(e))
+
+    logging.basicConfig(level=logging.INFO)
+    api_key = os.getenv("METEOBLUE_API_KEY")
+    if api_key is None:
+        raise RuntimeError("METEOBLUE_API_KEY must be defined.")
+
+    kwargs: dict = dict(
+        site_url=args.site_url,
+        api_key=api_key,
+        sites=args.sites if args.sites else [Site("CerroPachon")],
+        start=args.start,
+        end=args.end,
+        progress_file=args.progress_file,
+        archive_dir=args.archive_dir,
+        request_url=args.request_url,
+        modelrun_param=args.modelrun_param,
+        interval=args.interval,
+        max_concurrency=args.max_concurrency,
+        credit_budget=args.credit_budget,
+        credits_per_request=args.credits_per_request,
+        gap_fill_max_hours=args.gap_fill_max_hours,
+        gap_fill_max_days=args.gap_fill_max_days,
+    )
+    if args.replay:
+        async with salobj.Controller(name="WeatherForecast", index=None, write_only=True) as controller:
+            backfill = Backfill(controller=controller, **kwargs)
+            await backfill.run()
+    else:
+        backfill = Backfill(**kwargs)
+        await backfill.run()
+    return 1 if backfill.failed else 0
+
+
+def execute_backfill() -> None:
+    """Execute the backfill command line tool."""
+    raise SystemExit(asyncio.run(amain()))
@@ -33,5 +33,65 @@ properties:
     tel_loop_error_wait_time:
         description: How long to wait to retry when API calls fails
         type: number
+    gap_fill_max_hours:
+        description: >-
+            Longest run of missing values filled in the hourly trend.
+            winddirection is interpolated on the circle, pictocode is carried
+            forward and the other fields are interpolated linearly.
+            0 (the default) disables gap filling.
+        type: integer
+        minimum: 0
+        default: 0
+    gap_fill_max_days:
+        description: >-
+            Longest run of missing values filled in the daily trend.
+            0 (the default) disables gap filling.
+        type: integer
+        minimum: 0
+        default: 0
+    archive_dir:
+        description: >-
+            Directory of the local forecast archive.
+            Every decoded forecast is appended to it.
+            If null, forecasts are not archived.
+        anyOf:
+            - type: string
+            - type: "null"
+        default: null
+    profile_cycles:
+        description: >-
+            Number of forecast updates of the telemetry loop to profile
+            for CPU time and memory allocations.
+            0 disables profiling.
+            Overridden by the WEATHERFORECAST_PROFILE_CYCLES environment variable.
+        type: integer
+        minimum: 0
+        default: 0
+    profile_dir:
+        description: Directory the profiling results are written to.
+        type: string
+        default: /tmp/weatherforecast-profiles
+    profile_max_cpu_time:
+        description: >-
+            Cap on the CPU time of the whole process (all threads and tasks)
+            while profiling is enabled, in seconds. Profiling stops once
+            it is reached.
+        type: number
+        exclusiveMinimum: 0
+        default: 60
+    http_port:
+        description: >-
+            Port of the local read-only HTTP endpoint serving the latest
+            forecast. 0 picks a free port. If null, the endpoint is disabled.
+        anyOf:
+            - type: integer
+              minimum: 0
+              maximum: 65535
+            - type: "null"
+        default: null
+    http_host:
+        description: Interface the local HTTP endpoint listens on.
+        type: string
+        default: 127.0.0.1
 """
 )
@@ -22,14 +22,11 @@
 __all__ = [
     "WeatherForecastCSC",
     "execute_csc",
-    "GUARANTEED_DAILY_TREND_LENGTH",
-    "GUARANTEED_HOURLY_TREND_LENGTH",
     "command_csc",
 ]
 
 import asyncio
 import datetime
-import math
 import os
 import pathlib
 import types
@@ -39,20 +36,22 @@ import aiohttp
 from lsst.ts import salobj, utils
 
 from . import __version__
+from .archive import ForecastArchive
 from .config_schema import CONFIG_SCHEMA
+from .forecast import (
+    LATITUDE,
+    LONGITUDE,
+    SITE_URL,
+    cleanup_results,
+    convert_time,
+    decode_forecast,
+    fetch_forecast,
+    make_telemetry,
+)
+from .forecast_server import ForecastServer
+from .gap_fill import fill_forecast_gaps
 from .mock_server import MockServer
-
-LATITUDE: float = -30.24
-LONGITUDE: float = -70.749
-ELEVATION: int = 2650
-TIMEZONE: str = "America/Santiago"
-SITE_URL: str = "https://my.meteoblue.com"
-FORMAT: str = "json"
-REQUEST_URL: str = "/packages/trendpro-1h_trendpro-day"
-COUNT_HOURLY: int = 382
-COUNT_DAILY: int = 15
-GUARANTEED_HOURLY_TREND_LENGTH: int = 336
-GUARANTEED_DAILY_TREND_LENGTH: int = 14
+from .profiler import PROFILE_CYCLES_ENV, TelemetryProfiler
 
 
 def execute_csc() -> None:
@@ -98,6 +97,18 @@ class WeatherForecastCSC(salobj.ConfigurableCsc):
         The wait time for retrying if the API call fails.
     api_key : `str`
         The stored API key for Meteoblue received from an environment variable.
+    archive : `ForecastArchive` or `None`
+        The local forecast archive, if configured.
+    archive_task : `asyncio.Future`
+        A task that writes the latest forecast to the archive.
+    profiler : `TelemetryProfiler`
+        Profiles the next forecast updates, if requested.
+    gap_fill_max_hours : `int`
+        The longest gap filled in the hourly trend. (Hours)
+    gap_fill_max_days : `int`
+        The longest gap filled in the daily trend. (Days)
+    forecast_server : `ForecastServer` or `None`
+        The local HTTP endpoint serving the latest forecast, if configured.
     """
 
     valid_simulation_modes: tuple = (0, 1, 2, 3)
@@ -132,6 +143,12 @@ class WeatherForecastCSC(salobj.ConfigurableCsc):
         self.api_key: str | None = os.getenv("METEOBLUE_API_KEY")
         if self.api_key is None:
             raise RuntimeError("METEOBLUE_API_KEY must be defined.")
+        self.archive: ForecastArchive | None = None
+        self.archive_task: asyncio.Future = utils.make_done_future()
+        self.profiler: TelemetryProfiler = TelemetryProfiler(output_dir=".", log=self.log)
+        self.gap_fill_max_hours: int = 0
+        self.gap_fill_max_days: int = 0
+        self.forecast_server: ForecastServer | None = None
 
     @staticmethod
     def get_config_pkg() -> str:
@@ -139,6 +156,35 @@ class WeatherForecastCSC(salobj.ConfigurableCsc):
 
     async def configure(self, config: types.SimpleNamespace) -> None:
         self.tel_loop_error_wait_time = config.tel_loop_error_wait_time
+        self.gap_fill_max_hours = config.gap_fill_max_hours
+        self.gap_fill_max_days = config.gap_fill_max_days
+        self.archive = ForecastArchive(config.archive_dir) if config.archive_dir is not None else None
+        profile_cycles = config.profile_cycles
+        profile_cycles_env = os.getenv(PROFILE_CYCLES_ENV)
+        if profile_cycles_env:
+            try:
+                env_cycles = int(profile_cycles_env)
+            except ValueError:
+                env_cycles = -1
+            if env_cycles >= 0:
+                profile_cycles = env_cycles
+            else:
+                self.log.warning(
+                    f"Ignoring {PROFILE_CYCLES_ENV}={profile_cycles_env!r}: not a non-negative integer."
+                )
+        self.profiler = TelemetryProfiler(
+            output_dir=config.profile_dir,
+            cycles=profile_cycles,
+            max_cpu_time=config.profile_max_cpu_time,
+            log=self.log,
+        )
+        if self.profiler.active:
+            self.log.info(f"Profiling the next {profile_cycles} forecast updates to {config.profile_dir}.")
+        self.forecast_server = (
+            ForecastServer(host=config.http_host, port=config.http_port)
+            if config.http_port is not None
+            else None
+        )
 
     def convert_time(self, timestamp: str) -> float:
         """Convert timestamp string to unix timestamp.
@@ -156,20 +202,39 @@ class WeatherForecastCSC(salobj.ConfigurableCsc):
         result : `float`
             A timestamp float converted from string.
         """
-        result: float = (
-            datetime.datetime.strptime(timestamp, "%Y-%m-%d %H:%M")
-            .replace(tzinfo=zoneinfo.ZoneInfo("America/Santiago"))
-            .timestamp()
-        )
-        return result
+        return convert_time(timestamp)
 
     def cleanup_results(
         self, data: dict[str, list[int | float | None]]
     ) -> dict[str, list[float | int | None]]:
         """Convert None values to math.nan if found."""
-        for field in data:
-            data[field] = [math.nan if value is None else value for value in data[field]]
-        return data
+        return cleanup_results(data)
+
+    async def archive_forecast(
+        self,
+        metadata: dict,
+        hourly: dict[str, list[int | float | None]],
+        daily: dict[str, list[int | float | None]],
+    ) -> None:
+        """Write a forecast to the archive without blocking the event loop.
+
+        Errors are logged but do not fault the CSC.
+
+        Parameters
+        ----------
+        metadata : `dict`
+            The ``metadata`` field of the Meteoblue response.
+        hourly : `dict`
+            The hourly trend before gap filling, with converted timestamps.
+        daily : `dict`
+            The daily trend before gap filling, with converted timestamps.
+        """
+        if self.archive is None:
+            return
+        try:
+            await asyncio.to_thread(self.archive.write, metadata, hourly, daily)
+        except Exception:
+            self.log.exception("Failed to archive forecast.")
 
     async def telemetry(self) -> None:
         """Implement telemetry loop.
@@ -190,179 +255,68 @@ class WeatherForecastCSC(salobj.ConfigurableCsc):
             else:
                 time = datetime.datetime(year=2024, month=12, day=1, hour=4, minute=0, second=0)
             if (time.hour in [4, 16] or self.first_time) and not self.already_updated:
-                if self.simulation_mode:
-                    assert self.mock_server is not None
-                try:
-                    site_url = (
-                        f"{self.mock_server.url}"  # type: ignore
-                        if self.simulation_mode
-                        else SITE_URL
-                    )
-                    self.log.info(f"{site_url=}, {LATITUDE=}, {LONGITUDE=}")
-                    params: dict = {
-                        "lat": LATITUDE,
-                        "lon": LONGITUDE,
-                        "apikey": self.api_key,
-                        "asl": ELEVATION,
-                    }
-                    self.log.info("Querying Meteoblue.")
-                    async with aiohttp.ClientSession(site_url, raise_for_status=True) as session:
-                        async with session.get(
-                            REQUEST_URL,
-                            params=params,
-                        ) as resp:
-                            response = await resp.json()
-                            self.log.info("Got response.")
-                            # self.log.debug(f"{response=}")
-                except asyncio.CancelledError:
-                    self.log.exception("Telemetry loop cancelled.")
-                except Exception:
-                    self.log.exception(
-                        f"Failed to get response... Waiting for {self.tel_loop_error_wait_time}."
-                    )
-                    self.retries += 1
-                    await asyncio.sleep(self.tel_loop_error_wait_time)
-                    continue
-                if response:
+                with self.profiler.profile_cycle():
+                    if self.simulation_mode:
+                        assert self.mock_server is not None
                     try:
-                        self.last_hour = time.hour
-                        self.retries = 0
-                        metadata_fld = response["metadata"]
-                        modelrun_utc = datetime.datetime.strptime(
-                            metadata_fld["modelrun_utc"], "%Y-%m-%d %H:%M"
-                        ).timestamp()
-                        modelrun_updatetime_utc = datetime.datetime.strptime(
-                            metadata_fld["modelrun_updatetime_utc"], "%Y-%m-%d %H:%M"
-                        ).timestamp()
-                        # FIXME DM-43325 Remove str conversion once XML is
-                        # updated.
-                        await self.tel_metadata.set_write(
-                            latitude=metadata_fld["latitude"],
-                            longitude=metadata_fld["longitude"],
-                            height=metadata_fld["height"],
-                            timezoneAbbrevation=metadata_fld["timezone_abbrevation"],
-                            timeOffset=int(metadata_fld["utc_timeoffset"]),
-                            modelrun=str(modelrun_utc),
-                            modelrunUpdatetime=str(modelrun_updatetime_utc),
-                        )
-                        trend_hourly_fld = response["trend_1h"]
-                        trend_hourly_fld = self.cleanup_results(trend_hourly_fld)
-                        for name, values in trend_hourly_fld.items():
-                            trend_hourly_fld[name] = values[:GUARANTEED_HOURLY_TREND_LENGTH]
-                        timestamps = trend_hourly_fld["time"]
-                        converted_timestamps = [self.convert_time(timestamp) for timestamp in timestamps]
-                        await self.tel_hourlyTrend.set_write(
-                            timestamp=converted_timestamps,
-                            temperature=trend_hourly_fld["temperature"],
-                            temperatureSpread=trend_hourly_fld["temperature_spread"],
-                            precipitation=trend_hourly_fld["precipitation"],
-                            precipitationSpread=trend_hourly_fld["precipitation_spread"],
-                            windspeed=trend_hourly_fld["windspeed"],
-                            windspeedSpread=trend_hourly_fld["windspeed_spread"],
-                            windDirection=trend_hourly_fld["winddirection"],
-                            seaLevelPressure=trend_hourly_fld["sealevelpressure"],
-                            relativeHumidity=trend_hourly_fld["relativehumidity"],
-                            ghiBackwards=trend_hourly_fld["ghi_backwards"],
-                            extraTerrestrialRadiationBackwards=trend_hourly_fld[
-                                "extraterrestrialradiation_backwards"
-                            ],
-                            totalCloudCover=trend_hourly_fld["totalcloudcover"],
-                            totalCloudCoverSpread=trend_hourly_fld["totalcloudcover_spread"],
-                            snowFraction=trend_hourly_fld["snowfraction"],
-                            pictocode=trend_hourly_fld["pictocode"],
-                            gust=trend_hourly_fld["gust"],
-                            lowClouds=trend_hourly_fld["lowclouds"],
-                            midClouds=trend_hourly_fld["midclouds"],
-                            highClouds=trend_hourly_fld["highclouds"],
-                            sunshineTime=trend_hourly_fld["sunshinetime"],
-                            visibility=trend_hourly_fld["visibility"],
-                            skinTemperature=trend_hourly_fld["skintemperature"],
-                            dewPointTemperature=trend_hourly_fld["dewpointtemperature"],
-                            precipitationProbability=trend_hourly_fld["precipitation_probability"],
-                            cape=trend_hourly_fld["cape"],
-                            liftedIndex=trend_hourly_fld["liftedindex"],
-                            evapoTranspiration=trend_hourly_fld["evapotranspiration"],
-                            referenceEvapoTranspirationFao=trend_hourly_fld[
-                                "referenceevapotranspiration_fao"
-                            ],
+                        site_url = (
+                            f"{self.mock_server.url}"  # type: ignore
+                            if self.simulation_mode
+                            else SITE_URL
                         )
-                        trend_daily_fld = response["trend_day"]
-                        for name, values in trend_daily_fld.items():
-                            trend_daily_fld[name] = values[:GUARANTEED_DAILY_TREND_LENGTH]
-                        timestamps = trend_daily_fld["time"]
-                        converted_timestamps = [self.convert_time(timestamp) for timestamp in timestamps]
-                        await self.tel_dailyTrend.set_write(
-                            timestamp=converted_timestamps,
-                            pictocode=trend_daily_fld["pictocode"],
-                            temperatureMax=trend_daily_fld["temperature_max"],
-                            temperatureMin=trend_daily_fld["temperature_min"],
-                            temperatureMean=trend_daily_fld["temperature_mean"],
-                            temperatureSpread=trend_daily_fld["temperature_spread"],
-                            precipitation=trend_daily_fld["precipitation"],
-                            precipitationProbability=trend_daily_fld["precipitation_probability"],
-                            precipitationSpread=trend_daily_fld["precipitation_spread"],
-                            windspeedMax=trend_daily_fld["windspeed_max"],
-                            windspeedMin=trend_daily_fld["windspeed_min"],
-                            windspeedMean=trend_daily_fld["windspeed_mean"],
-                            windspeedSpread=trend_daily_fld["windspeed_spread"],
-                            windDirection=trend_daily_fld["winddirection"],
-                            seaLevelPressureMax=trend_daily_fld["sealevelpressure_max"],
-                            seaLevelPressureMin=trend_daily_fld["sealevelpressure_min"],
-                            seaLevelPressureMean=trend_daily_fld["sealevelpressure_mean"],
-                            relativeHumidityMax=trend_daily_fld["relativehumidity_max"],
-                            relativeHumidityMin=trend_daily_fld["relativehumidity_min"],
-                            relativeHumidityMean=trend_daily_fld["relativehumidity_mean"],
-                            predictability=trend_daily_fld["predictability"],
-                            predictabilityClass=trend_daily_fld["predictability_class"],
-                            totalCloudCoverMax=trend_daily_fld["totalcloudcover_max"],
-                            totalCloudCoverMin=trend_daily_fld["totalcloudcover_min"],
-                            totalCloudCoverMean=trend_daily_fld["totalcloudcover_mean"],
-                            totalCloudCoverSpread=trend_daily_fld["totalcloudcover_spread"],
-                            snowFraction=trend_daily_fld["snowfraction"],
-                            ghiTotal=trend_daily_fld["ghi_total"],
-                            extraTerrestrialRadiationTotal=trend_daily_fld["extraterrestrialradiation_total"],
-                            gustMax=trend_daily_fld["gust_max"],
-                            gustMin=trend_daily_fld["gust_min"],
-                            gustMean=trend_daily_fld["gust_mean"],
-                            lowCloudsMax=trend_daily_fld["lowclouds_max"],
-                            lowCloudsMin=trend_daily_fld["lowclouds_min"],
-                            lowCloudsMean=trend_daily_fld["lowclouds_mean"],
-                            midCloudsMax=trend_daily_fld["midclouds_max"],
-                            midCloudsMin=trend_daily_fld["midclouds_min"],
-                            midCloudsMean=trend_daily_fld["midclouds_mean"],
-                            hiCloudsMax=trend_daily_fld["hiclouds_max"],
-                            hiCloudsMin=trend_daily_fld["hiclouds_min"],
-                            hiCloudsMean=trend_daily_fld["hiclouds_mean"],
-                            sunshineTime=trend_daily_fld["sunshinetime"],
-                            visibilityMax=trend_daily_fld["visibility_max"],
-                            visibilityMin=trend_daily_fld["visibility_min"],
-                            visibilityMean=trend_daily_fld["visibility_mean"],
-                            skinTemperatureMax=trend_daily_fld["skintemperature_max"],
-                            skinTemperatureMin=trend_daily_fld["skintemperature_min"],
-                            skinTemperatureMean=trend_daily_fld["skintemperature_mean"],
-                            dewPointTemperatureMax=trend_daily_fld["dewpointtemperature_max"],
-                            dewPointTemperatureMin=trend_daily_fld["dewpointtemperature_min"],
-                            dewPointTemperatureMean=trend_daily_fld["dewpointtemperature_mean"],
-                            capeMax=trend_daily_fld["cape_max"],
-                            capeMin=trend_daily_fld["cape_min"],
-                            capeMean=trend_daily_fld["cape_mean"],
-                            liftedIndexMax=trend_daily_fld["liftedindex_max"],
-                            liftedIndexMin=trend_daily_fld["liftedindex_min"],
-                            liftedIndexMean=trend_daily_fld["liftedindex_mean"],
-                            evapoTranspiration=trend_daily_fld["evapotranspiration"],
-                            referenceEvapoTranspirationFao=trend_daily_fld["referenceevapotranspiration_fao"],
-                        )
-                        self.already_updated = True
-                        self.first_time = False
+                        self.log.info(f"{site_url=}, {LATITUDE=}, {LONGITUDE=}")
+                        self.log.info("Querying Meteoblue.")
+                        async with aiohttp.ClientSession(site_url, raise_for_status=True) as session:
+                            response = await fetch_forecast(session, self.api_key)
+                        self.log.info("Got response.")
                     except asyncio.CancelledError:
-                        self.log.exception("Telemetry loop cancelled")
-
+                        self.log.exception("Telemetry loop cancelled.")
                     except Exception:
-                        self.log.exception("There was a problem in the telemetry loop.")
-                        # FIXME Create ErrorCode enum in ts_xml and replace
-                        # code with value.
-                        await self.fault(code=2, report="There was a problem in the telemetry loop.")
-                        return
+                        self.log.exception(
+                            f"Failed to get response... Waiting for {self.tel_loop_error_wait_time}."
+                        )
+                        self.retries += 1
+                        await asyncio.sleep(self.tel_loop_error_wait_time)
+                        continue
+                    if response:
+                        try:
+                            self.last_hour = time.hour
+                            self.retries = 0
+                            decoded = decode_forecast(response)
+                            # Archive the trends as received, so that filled
+                            # values are never mistaken for forecast values.
+                            unfilled_hourly = dict(decoded["trend_1h"])
+                            unfilled_daily = dict(decoded["trend_day"])
+                            fill_counts = fill_forecast_gaps(
+                                decoded, self.gap_fill_max_hours, self.gap_fill_max_days
+                            )
+                            for trend_name, counts in fill_counts.items():
+                                if counts:
+                                    self.log.info(f"Filled gaps in {trend_name}: {counts}.")
+                            for topic_name, data in make_telemetry(decoded).items():
+                                await getattr(self, f"tel_{topic_name}").set_write(**data)
+                            if self.archive is not None:
+                                self.archive_task = asyncio.create_task(
+                                    self.archive_forecast(
+                                        decoded["metadata"], unfilled_hourly, unfilled_daily
+                                    )
+                                )
+                            if self.forecast_server is not None:
+                                try:
+                                    self.forecast_server.update(decoded)
+                                except Exception:
+                                    self.log.exception("Failed to update the forecast server.")
+                            self.already_updated = True
+                            self.first_time = False
+                        except asyncio.CancelledError:
+                            self.log.exception("Telemetry loop cancelled")
+
+                        except Exception:
+                            self.log.exception("There was a problem in the telemetry loop.")
+                            # FIXME Create ErrorCode enum in ts_xml and replace
+                            # code with value.
+                            await self.fault(code=2, report="There was a problem in the telemetry loop.")
+                            return
             else:
                 if time.hour != self.last_hour:
                     self.already_updated = False
@@ -372,9 +326,9 @@ class WeatherForecastCSC(salobj.ConfigurableCsc):
         """Handle summary state transitions.
 
         If the CSC transitions to the disabled (or enabled) state,
-        start the telemetry loop.
+        start the telemetry loop and the forecast server.
         If exiting out of disabled (or enabled) state,
-        stop the telemetry loop.
+        stop the telemetry loop and the forecast server.
         """
         if self.disabled_or_enabled:
             if self.mock_server is None and self.simulation_mode:
@@ -388,6 +342,9 @@ class WeatherForecastCSC(salobj.ConfigurableCsc):
                     self.mock_server = MockServer(bad_request=True)
                 assert self.mock_server is not None
                 await self.mock_server.start()
+            if self.forecast_server is not None and self.forecast_server.runner is None:
+                await self.forecast_server.start()
+                self.log.info(f"Serving forecasts on {self.forecast_server.url}.")
             if self.telemetry_task.done():
                 self.telemetry_task = asyncio.create_task(self.telemetry())
         else:
@@ -397,3 +354,12 @@ class WeatherForecastCSC(salobj.ConfigurableCsc):
                 server = self.mock_server
                 self.mock_server = None
                 await server.cleanup()
+            if self.forecast_server is not None:
+                await self.forecast_server.cleanup()
+
+    async def close_tasks(self) -> None:
+        """Stop the forecast server and finish archiving, then close."""
+        if self.forecast_server is not None:
+            await self.forecast_server.cleanup()
+        await self.archive_task
+        await super().close_tasks()
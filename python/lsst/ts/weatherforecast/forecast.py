@@ -0,0 +1,284 @@
+# This file is part of ts_weatherforecast.
+#
+# Developed for the Vera C. Rubin Observatory Telescope and Site Systems.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+__all__ = [
+    "GUARANTEED_DAILY_TREND_LENGTH",
+    "GUARANTEED_HOURLY_TREND_LENGTH",
+    "cleanup_results",
+    "convert_time",
+    "decode_forecast",
+    "fetch_forecast",
+    "make_telemetry",
+]
+
+import datetime
+import math
+import zoneinfo
+
+import aiohttp
+
+LATITUDE: float = -30.24
+LONGITUDE: float = -70.749
+ELEVATION: int = 2650
+TIMEZONE: str = "America/Santiago"
+SITE_URL: str = "https://my.meteoblue.com"
+FORMAT: str = "json"
+REQUEST_URL: str = "/packages/trendpro-1h_trendpro-day"
+COUNT_HOURLY: int = 382
+COUNT_DAILY: int = 15
+GUARANTEED_HOURLY_TREND_LENGTH: int = 336
+GUARANTEED_DAILY_TREND_LENGTH: int = 14
+
+
+async def fetch_forecast(
+    session: aiohttp.ClientSession,
+    api_key: str | None,
+    latitude: float = LATITUDE,
+    longitude: float = LONGITUDE,
+    elevation: float = ELEVATION,
+    request_url: str = REQUEST_URL,
+    extra_params: dict | None = None,
+) -> dict:
+    """Download a forecast from the Meteoblue API.
+
+    Parameters
+    ----------
+    session : `aiohttp.ClientSession`
+        The session to use, with the site URL as base URL.
+    api_key : `str` or `None`
+        The Meteoblue API key.
+    latitude : `float`
+        The latitude of the forecast. (Degrees)
+    longitude : `float`
+        The longitude of the forecast. (Degrees)
+    elevation : `float`
+        The elevation above sea level of the forecast. (Meters)
+    request_url : `str`
+        The path of the forecast package.
+    extra_params : `dict` or `None`
+        Additional URL parameters.
+
+    Returns
+    -------
+    response : `dict`
+        The decoded json response.
+    """
+    params: dict = {
+        "lat": latitude,
+        "lon": longitude,
+        "apikey": api_key,
+        "asl": elevation,
+    }
+    if extra_params is not None:
+        params.update(extra_params)
+    async with session.get(request_url, params=params) as resp:
+        response: dict = await resp.json()
+    return response
+
+
+def convert_time(timestamp: str) -> float:
+    """Convert timestamp string to unix timestamp.
+
+    This is used to convert the string that MeteoBlue returns for time
+    into a timestamp that can be published over DDS.
+
+    Parameters
+    ----------
+    timestamp : `str`
+        The time to convert.
+
+    Returns
+    -------
+    result : `float`
+        A timestamp float converted from string.
+    """
+    result: float = (
+        datetime.datetime.strptime(timestamp, "%Y-%m-%d %H:%M")
+        .replace(tzinfo=zoneinfo.ZoneInfo(TIMEZONE))
+        .timestamp()
+    )
+    return result
+
+
+def cleanup_results(data: dict[str, list[int | float | None]]) -> dict[str, list[float | int | None]]:
+    """Convert None values to math.nan if found."""
+    for field in data:
+        data[field] = [math.nan if value is None else value for value in data[field]]
+    return data
+
+
+def decode_forecast(response: dict) -> dict[str, dict]:
+    """Prepare a Meteoblue response for publication.
+
+    Clean up the hourly trend, truncate both trends to their guaranteed
+    length and convert their ``time`` strings to unix timestamps.
+
+    Parameters
+    ----------
+    response : `dict`
+        The json response from Meteoblue. It is modified in place.
+
+    Returns
+    -------
+    decoded : `dict` [`str`, `dict`]
+        The ``metadata``, ``trend_1h`` and ``trend_day`` fields
+        of the response.
+    """
+    trend_hourly_fld = cleanup_results(response["trend_1h"])
+    for name, values in trend_hourly_fld.items():
+        trend_hourly_fld[name] = values[:GUARANTEED_HOURLY_TREND_LENGTH]
+    trend_hourly_fld["time"] = [convert_time(timestamp) for timestamp in trend_hourly_fld["time"]]
+    trend_daily_fld = response["trend_day"]
+    for name, values in trend_daily_fld.items():
+        trend_daily_fld[name] = values[:GUARANTEED_DAILY_TREND_LENGTH]
+    trend_daily_fld["time"] = [convert_time(timestamp) for timestamp in trend_daily_fld["time"]]
+    return {
+        "metadata": response["metadata"],
+        "trend_1h": trend_hourly_fld,
+        "trend_day": trend_daily_fld,
+    }
+
+
+def make_telemetry(decoded: dict[str, dict]) -> dict[str, dict]:
+    """Map a decoded forecast onto the WeatherForecast telemetry topics.
+
+    Parameters
+    ----------
+    decoded : `dict` [`str`, `dict`]
+        The forecast returned by `decode_forecast`.
+
+    Returns
+    -------
+    telemetry : `dict` [`str`, `dict`]
+        The fields of the ``metadata``, ``hourlyTrend`` and ``dailyTrend``
+        topics, by topic name.
+    """
+    metadata_fld = decoded["metadata"]
+    hourly = decoded["trend_1h"]
+    daily = decoded["trend_day"]
+    modelrun_utc = datetime.datetime.strptime(metadata_fld["modelrun_utc"], "%Y-%m-%d %H:%M").timestamp()
+    modelrun_updatetime_utc = datetime.datetime.strptime(
+        metadata_fld["modelrun_updatetime_utc"], "%Y-%m-%d %H:%M"
+    ).timestamp()
+    return {
+        # FIXME DM-43325 Remove str conversion once XML is updated.
+        "metadata": dict(
+            latitude=metadata_fld["latitude"],
+            longitude=metadata_fld["longitude"],
+            height=metadata_fld["height"],
+            timezoneAbbrevation=metadata_fld["timezone_abbrevation"],
+            timeOffset=int(metadata_fld["utc_timeoffset"]),
+            modelrun=str(modelrun_utc),
+            modelrunUpdatetime=str(modelrun_updatetime_utc),
+        ),
+        "hourlyTrend": dict(
+            timestamp=hourly["time"],
+            temperature=hourly["temperature"],
+            temperatureSpread=hourly["temperature_spread"],
+            precipitation=hourly["precipitation"],
+            precipitationSpread=hourly["precipitation_spread"],
+            windspeed=hourly["windspeed"],
+            windspeedSpread=hourly["windspeed_spread"],
+            windDirection=hourly["winddirection"],
+            seaLevelPressure=hourly["sealevelpressure"],
+            relativeHumidity=hourly["relativehumidity"],
+            ghiBackwards=hourly["ghi_backwards"],
+            extraTerrestrialRadiationBackwards=hourly["extraterrestrialradiation_backwards"],
+            totalCloudCover=hourly["totalcloudcover"],
+            totalCloudCoverSpread=hourly["totalcloudcover_spread"],
+            snowFraction=hourly["snowfraction"],
+            pictocode=hourly["pictocode"],
+            gust=hourly["gust"],
+            lowClouds=hourly["lowclouds"],
+            midClouds=hourly["midclouds"],
+            highClouds=hourly["highclouds"],
+            sunshineTime=hourly["sunshinetime"],
+            visibility=hourly["visibility"],
+            skinTemperature=hourly["skintemperature"],
+            dewPointTemperature=hourly["dewpointtemperature"],
+            precipitationProbability=hourly["precipitation_probability"],
+            cape=hourly["cape"],
+            liftedIndex=hourly["liftedindex"],
+            evapoTranspiration=hourly["evapotranspiration"],
+            referenceEvapoTranspirationFao=hourly["referenceevapotranspiration_fao"],
+        ),
+        "dailyTrend": dict(
+            timestamp=daily["time"],
+            pictocode=daily["pictocode"],
+            temperatureMax=daily["temperature_max"],
+            temperatureMin=daily["temperature_min"],
+            temperatureMean=daily["temperature_mean"],
+            temperatureSpread=daily["temperature_spread"],
+            precipitation=daily["precipitation"],
+            precipitationProbability=daily["precipitation_probability"],
+            precipitationSpread=daily["precipitation_spread"],
+            windspeedMax=daily["windspeed_max"],
+            windspeedMin=daily["windspeed_min"],
+            windspeedMean=daily["windspeed_mean"],
+            windspeedSpread=daily["windspeed_spread"],
+            windDirection=daily["winddirection"],
+            seaLevelPressureMax=daily["sealevelpressure_max"],
+            seaLevelPressureMin=daily["sealevelpressure_min"],
+            seaLevelPressureMean=daily["sealevelpressure_mean"],
+            relativeHumidityMax=daily["relativehumidity_max"],
+            relativeHumidityMin=daily["relativehumidity_min"],
+            relativeHumidityMean=daily["relativehumidity_mean"],
+            predictability=daily["predictability"],
+            predictabilityClass=daily["predictability_class"],
+            totalCloudCoverMax=daily["totalcloudcover_max"],
+            totalCloudCoverMin=daily["totalcloudcover_min"],
+            totalCloudCoverMean=daily["totalcloudcover_mean"],
+            totalCloudCoverSpread=daily["totalcloudcover_spread"],
+            snowFraction=daily["snowfraction"],
+            ghiTotal=daily["ghi_total"],
+            extraTerrestrialRadiationTotal=daily["extraterrestrialradiation_total"],
+            gustMax=daily["gust_max"],
+            gustMin=daily["gust_min"],
+            gustMean=daily["gust_mean"],
+            lowCloudsMax=daily["lowclouds_max"],
+            lowCloudsMin=daily["lowclouds_min"],
+            lowCloudsMean=daily["lowclouds_mean"],
+            midCloudsMax=daily["midclouds_max"],
+            midCloudsMin=daily["midclouds_min"],
+            midCloudsMean=daily["midclouds_mean"],
+            hiCloudsMax=daily["hiclouds_max"],
+            hiCloudsMin=daily["hiclouds_min"],
+            hiCloudsMean=daily["hiclouds_mean"],
+            sunshineTime=daily["sunshinetime"],
+            visibilityMax=daily["visibility_max"],
+            visibilityMin=daily["visibility_min"],
+            visibilityMean=daily["visibility_mean"],
+            skinTemperatureMax=daily["skintemperature_max"],
+            skinTemperatureMin=daily["skintemperature_min"],
+            skinTemperatureMean=daily["skintemperature_mean"],
+            dewPointTemperatureMax=daily["dewpointtemperature_max"],
+            dewPointTemperatureMin=daily["dewpointtemperature_min"],
+            dewPointTemperatureMean=daily["dewpointtemperature_mean"],
+            capeMax=daily["cape_max"],
+            capeMin=daily["cape_min"],
+            capeMean=daily["cape_mean"],
+            liftedIndexMax=daily["liftedindex_max"],
+            liftedIndexMin=daily["liftedindex_min"],
+            liftedIndexMean=daily["liftedindex_mean"],
+            evapoTranspiration=daily["evapotranspiration"],
+            referenceEvapoTranspirationFao=daily["referenceevapotranspiration_fao"],
+        ),
+    }
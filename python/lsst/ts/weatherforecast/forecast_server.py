@@ -0,0 +1,256 @@
+# This file is part of ts_weatherforecast.
+#
+# Developed for the Vera C. Rubin Observatory Telescope and Site Systems.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+__all__ = ["ForecastServer"]
+
+import gzip
+import hashlib
+import json
+import logging
+import math
+
+import numpy as np
+from aiohttp import web
+
+SUMMARY_HORIZONS: tuple[int, ...] = (24, 48)
+
+
+class ForecastServer:
+    """Serve the latest forecast over a local read-only HTTP endpoint.
+
+    The responses are serialized and compressed once per forecast
+    by `update`, so that answering a request costs only a lookup.
+    Every response carries an ETag; clients that send it back in
+    ``If-None-Match`` get an empty ``304 Not Modified``.
+
+    Routes:
+
+    * ``/forecast`` - the decoded forecast: ``metadata``, ``trend_1h``
+      and ``trend_day``, with times as unix timestamps.
+    * ``/summary`` - statistics of the hourly trend over the first
+      24 and 48 hours of the forecast.
+
+    Parameters
+    ----------
+    host : `str`
+        The interface the server listens on.
+    port : `int`
+        The port the server listens on. 0 picks a free port.
+
+    Attributes
+    ----------
+    host : `str`
+        The interface the server listens on.
+    port : `int`
+        The port the server listens on.
+    runner : `None`
+        The webapp runner.
+    site : `None`
+        The webapp site object.
+    url : `str`
+        The URL the server listens on, once started.
+    bodies : `dict` [`str`, `tuple`]
+        The identity and gzip bodies and their ETags, by route.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0) -> None:
+        self.host: str = host
+        self.port: int = port
+        self.runner: None | web.AppRunner = None
+        self.site: None | web.TCPSite = None
+        self.url: str = ""
+        self.bodies: dict[str, tuple[bytes, str, bytes, str]] = {}
+        self.log: logging.Logger = logging.getLogger(__name__)
+
+    def make_app(self) -> web.Application:
+        """Make the app.
+
+        Returns
+        -------
+        app : `web.Application`
+            The app with the routes added.
+        """
+        app = web.Application()
+        app.add_routes(
+            [
+                web.get("/forecast", self.handle_forecast),
+                web.get("/summary", self.handle_summary),
+            ]
+        )
+        return app
+
+    async def start(self) -> None:
+        """Start the server."""
+        if self.runner is not None:
+            raise RuntimeError("Application already started.")
+        app: web.Application = self.make_app()
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        self.site = web.TCPSite(self.runner, self.host, self.port)
+        await self.site.start()
+        self.url = self.site.name
+
+    async def cleanup(self) -> None:
+        """Clean up the server."""
+        if self.runner is not None:
+            runner = self.runner
+            self.runner = None
+            await runner.cleanup()
+
+    def update(self, decoded: dict[str, dict]) -> None:
+        """Serialize a new forecast for the routes to serve.
+
+        Parameters
+        ----------
+        decoded : `dict` [`str`, `dict`]
+            The forecast returned by `decode_forecast`.
+        """
+        documents = {
+            "/forecast": {name: to_json_safe(value) for name, value in decoded.items()},
+            "/summary": make_summary(decoded),
+        }
+        bodies = {}
+        for route, document in documents.items():
+            body = json.dumps(document, allow_nan=False, separators=(",", ":")).encode()
+            etag = f'"{hashlib.blake2b(body, digest_size=12).hexdigest()}"'
+            gzip_body = gzip.compress(body, compresslevel=6)
+            bodies[route] = (body, etag, gzip_body, f'{etag[:-1]}-gzip"')
+        self.bodies = bodies
+
+    def make_response(self, request: web.Request, route: str) -> web.Response:
+        """Return the cached response of a route.
+
+        Parameters
+        ----------
+        request : `web.Request`
+            The request.
+        route : `str`
+            The route to respond with.
+
+        Returns
+        -------
+        `web.Response`
+            The body, a ``304`` if the client's copy is current,
+            or a ``503`` if there is no forecast yet.
+        """
+        if route not in self.bodies:
+            raise web.HTTPServiceUnavailable(text="No forecast available yet.")
+        body, etag, gzip_body, gzip_etag = self.bodies[route]
+        use_gzip = accepts_gzip(request.headers.get("Accept-Encoding", ""))
+        if use_gzip:
+            body, etag = gzip_body, gzip_etag
+        headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+        if etag_matches(request.headers.get("If-None-Match", ""), etag):
+            return web.Response(status=304, headers=headers)
+        if use_gzip:
+            headers["Content-Encoding"] = "gzip"
+        return web.Response(body=body, content_type="application/json", headers=headers)
+
+    async def handle_forecast(self, request: web.Request) -> web.Response:
+        """Return the latest decoded forecast."""
+        return self.make_response(request, "/forecast")
+
+    async def handle_summary(self, request: web.Request) -> web.Response:
+        """Return the summary of the latest forecast."""
+        return self.make_response(request, "/summary")
+
+
+def accepts_gzip(accept_encoding: str) -> bool:
+    """Does an ``Accept-Encoding`` header accept gzip?
+
+    gzip is accepted if it, or else ``*``, is listed with a non-zero
+    quality value. An invalid quality value counts as zero.
+    """
+    qualities: dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        coding, *params = [part.strip() for part in item.split(";")]
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0
+        qualities[coding.lower()] = quality
+    quality = qualities.get("gzip", qualities.get("x-gzip", qualities.get("*", 0)))
+    return quality > 0
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Does an ``If-None-Match`` header match an ETag?
+
+    As required for ``If-None-Match``, the comparison is weak:
+    the ``W/`` prefix is ignored.
+    """
+    if if_none_match.strip() == "*":
+        return True
+    return etag.removeprefix("W/") in [value.strip().removeprefix("W/") for value in if_none_match.split(",")]
+
+
+def to_json_safe(value: object) -> object:
+    """Replace NaN with None so that ``value`` is valid JSON."""
+    if isinstance(value, dict):
+        return {key: to_json_safe(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [None if isinstance(item, float) and math.isnan(item) else item for item in value]
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+def make_summary(decoded: dict[str, dict]) -> dict:
+    """Summarize the hourly trend of a forecast.
+
+    Parameters
+    ----------
+    decoded : `dict` [`str`, `dict`]
+        The forecast returned by `decode_forecast`.
+
+    Returns
+    -------
+    summary : `dict`
+        The model run and, for each horizon, the extremes of temperature,
+        wind and cloud cover and the total precipitation.
+    """
+    hourly = decoded["trend_1h"]
+
+    def reduce(name: str, function: str, length: int) -> float | None:
+        values = np.array(hourly[name][:length], dtype=np.float64)
+        if not np.any(np.isfinite(values)):
+            return None
+        return float(getattr(np, f"nan{function}")(values))
+
+    summary: dict = {
+        "modelrun_utc": decoded["metadata"]["modelrun_utc"],
+        "start": hourly["time"][0] if hourly["time"] else None,
+    }
+    for hours in SUMMARY_HORIZONS:
+        summary[f"next_{hours}h"] = {
+            "temperature_min": reduce("temperature", "min", hours),
+            "temperature_max": reduce("temperature", "max", hours),
+            "windspeed_max": reduce("windspeed", "max", hours),
+            "gust_max": reduce("gust", "max", hours),
+            "precipitation_total": reduce("precipitation", "sum", hours),
+            "precipitation_probability_max": reduce("precipitation_probability", "max", hours),
+            "totalcloudcover_mean": reduce("totalcloudcover", "mean", hours),
+        }
+    return summary
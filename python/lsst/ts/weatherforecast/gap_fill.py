@@ -0,0 +1,179 @@
+# This file is part of ts_weatherforecast.
+#
+# Developed for the Vera C. Rubin Observatory Telescope and Site Systems.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+__all__ = [
+    "CATEGORICAL_FIELDS",
+    "CIRCULAR_FIELDS",
+    "INTEGER_FIELDS",
+    "fill_forecast_gaps",
+    "fill_gaps",
+    "fill_trend_gaps",
+]
+
+import numpy as np
+
+CIRCULAR_FIELDS: frozenset[str] = frozenset({"winddirection"})
+CATEGORICAL_FIELDS: frozenset[str] = frozenset({"pictocode", "predictability_class"})
+INTEGER_FIELDS: frozenset[str] = frozenset(
+    {"pictocode", "precipitation_probability", "predictability", "predictability_class"}
+)
+
+
+def fill_gaps(values: np.ndarray, max_gap: int, kind: str = "linear") -> tuple[np.ndarray, np.ndarray]:
+    """Fill the short runs of NaN in an array.
+
+    Parameters
+    ----------
+    values : `numpy.ndarray`
+        The 1-D array to fill.
+    max_gap : `int`
+        The longest run of NaN to fill. Longer runs are left as is.
+    kind : `str`
+        How to fill a run:
+
+        * "linear" - interpolate between the values on either side.
+        * "circular" - interpolate along the shorter arc between
+          the angles on either side. (Degrees)
+        * "previous" - carry the last value forward.
+          Runs at the end of the array are filled too.
+
+    Returns
+    -------
+    filled : `numpy.ndarray`
+        A copy of ``values`` with the short gaps filled.
+    mask : `numpy.ndarray`
+        True where a value was filled.
+
+    Raises
+    ------
+    ValueError
+        If ``kind`` is not valid.
+    """
+    if kind not in ("linear", "circular", "previous"):
+        raise ValueError(f"kind must be linear, circular or previous, not {kind!r}.")
+    filled = np.array(values, dtype=np.float64)
+    size = filled.size
+    valid = ~np.isnan(filled)
+    if valid.all() or not valid.any() or max_gap < 1:
+        return filled, np.zeros(size, dtype=bool)
+
+    # Index of the last valid value at or before, and the first valid value
+    # at or after, each position; -1 and size where there is none.
+    index = np.arange(size)
+    prev_index = np.maximum.accumulate(np.where(valid, index, -1))
+    next_index = np.minimum.accumulate(np.where(valid, index, size)[::-1])[::-1]
+    mask = ~valid & (prev_index >= 0)
+    if kind == "previous":
+        mask &= next_index - prev_index - 1 <= max_gap
+    else:
+        mask &= (next_index < size) & (next_index - prev_index - 1 <= max_gap)
+    # Index the gaps once; fancy indexing with a boolean mask is much slower.
+    gaps = np.flatnonzero(mask)
+    prev_gaps = prev_index[gaps]
+    before = filled[prev_gaps]
+    if kind == "previous":
+        filled[gaps] = before
+        return filled, mask
+
+    next_gaps = next_index[gaps]
+    after = filled[next_gaps]
+    weight = (gaps - prev_gaps) / (next_gaps - prev_gaps)
+    if kind == "circular":
+        difference = (after - before + 180) % 360 - 180
+        filled[gaps] = (before + weight * difference) % 360
+    else:
+        filled[gaps] = before + weight * (after - before)
+    return filled, mask
+
+
+def fill_trend_gaps(trend: dict[str, list], max_gap: int) -> dict[str, int]:
+    """Fill the short gaps of every field of a trend in place.
+
+    ``winddirection`` is interpolated on the circle, ``pictocode`` and
+    ``predictability_class`` are carried forward and the other fields are
+    interpolated linearly. The values of ``INTEGER_FIELDS`` stay integers:
+    interpolated values are rounded.
+    ``time`` and fields without gaps are left untouched.
+    The lists of filled fields are replaced rather than modified, so a
+    shallow copy of ``trend`` keeps the values as received.
+
+    Parameters
+    ----------
+    trend : `dict` [`str`, `list`]
+        The trend to fill. Missing values are NaN or None.
+    max_gap : `int`
+        The longest run of missing values to fill.
+
+    Returns
+    -------
+    fill_counts : `dict` [`str`, `int`]
+        The number of values filled, for every field that had gaps.
+    """
+    fill_counts: dict[str, int] = {}
+    for name, values in trend.items():
+        if name == "time":
+            continue
+        array = np.array(values, dtype=np.float64)
+        if not np.isnan(array).any():
+            continue
+        if name in CATEGORICAL_FIELDS:
+            kind = "previous"
+        elif name in CIRCULAR_FIELDS:
+            kind = "circular"
+        else:
+            kind = "linear"
+        filled, mask = fill_gaps(array, max_gap, kind)
+        fill_counts[name] = int(mask.sum())
+        if name in INTEGER_FIELDS:
+            # Gaps too long to fill stay NaN, so cast to Python objects.
+            present = ~np.isnan(filled)
+            integers = filled.astype(object)
+            integers[present] = np.rint(filled[present]).astype(np.int64)
+            trend[name] = integers.tolist()
+        else:
+            trend[name] = filled.tolist()
+    return fill_counts
+
+
+def fill_forecast_gaps(decoded: dict[str, dict], max_hours: int, max_days: int) -> dict[str, dict[str, int]]:
+    """Fill the short gaps of both trends of a decoded forecast.
+
+    Parameters
+    ----------
+    decoded : `dict` [`str`, `dict`]
+        The forecast returned by `decode_forecast`. It is modified in place,
+        and the fill counts are added as ``fill_counts``.
+    max_hours : `int`
+        The longest gap to fill in the hourly trend. (Hours)
+    max_days : `int`
+        The longest gap to fill in the daily trend. (Days)
+
+    Returns
+    -------
+    fill_counts : `dict` [`str`, `dict` [`str`, `int`]]
+        The fill counts of ``trend_1h`` and ``trend_day``.
+    """
+    fill_counts = {
+        "trend_1h": fill_trend_gaps(decoded["trend_1h"], max_hours),
+        "trend_day": fill_trend_gaps(decoded["trend_day"], max_days),
+    }
+    decoded["fill_counts"] = fill_counts
+    return fill_counts
@@ -21,6 +21,7 @@
 
 __all__ = ["MockServer"]
 
+import copy
 import json
 import logging
 import pathlib
@@ -49,6 +50,8 @@ class MockServer:
     bad_request_counter : `int`
         Meant to count the number of bad requests to send before returning
         a good response.
+    request_count : `int`
+        The number of forecast requests received.
     """
 
     def __init__(
@@ -63,6 +66,7 @@ class MockServer:
         test_file: pathlib.Path = pathlib.Path(data)
         self.bad_request_counter: int = 0
         self.bad_request: bool = bad_request
+        self.request_count: int = 0
         self.log: logging.Logger = logging.getLogger(__name__)
         with open(test_file) as f:
             self.response: dict = json.load(f)
@@ -110,9 +114,17 @@ class MockServer:
         `web.Response`
             The canned json response.
             See the test file in the data directory for the format.
+            If the ``modelrun`` parameter is given, the model run times
+            in the metadata are set to it.
         """
+        self.request_count += 1
         if self.bad_request:
             self.log.info(f"Inside bad request check. {self.bad_request_counter=}")
             self.bad_request_counter += 1
             raise web.HTTPInternalServerError()
+        if "modelrun" in request.query:
+            response = copy.deepcopy(self.response)
+            response["metadata"]["modelrun_utc"] = request.query["modelrun"]
+            response["metadata"]["modelrun_updatetime_utc"] = request.query["modelrun"]
+            return web.json_response(response)
         return web.json_response(self.response)
@@ -0,0 +1,192 @@
+# This file is part of ts_weatherforecast.
+#
+# Developed for the Vera C. Rubin Observatory Telescope and Site Systems.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+__all__ = ["TelemetryProfiler", "PROFILE_CYCLES_ENV"]
+
+import asyncio
+import contextlib
+import cProfile
+import datetime
+import logging
+import pathlib
+import time
+import tracemalloc
+import typing
+
+PROFILE_CYCLES_ENV: str = "WEATHERFORECAST_PROFILE_CYCLES"
+TRACEMALLOC_FRAMES: int = 10
+TOP_ALLOCATIONS: int = 25
+CHECK_INTERVAL: float = 0.5
+
+
+class TelemetryProfiler:
+    """Profile a limited number of telemetry loop cycles.
+
+    Each profiled cycle is run under `cProfile` with `tracemalloc`
+    tracing allocations. The CPU profile is written as a ``.prof`` file
+    readable by `pstats`, and the allocation growth over the cycle is
+    written as a ``.txt`` file.
+
+    The overhead is bounded by a cap on the CPU time of the whole process
+    (every thread and task, not only the telemetry loop) while profiling
+    is enabled, including the allocation snapshots and writing the results.
+    The cap is checked whenever a profiled cycle awaits,
+    so a long cycle stops being profiled once it reaches the cap;
+    the remaining cycles are then skipped.
+
+    Parameters
+    ----------
+    output_dir : `str` or `pathlib.Path`
+        The directory the results are written to.
+    cycles : `int`
+        The number of cycles to profile. 0 disables profiling.
+    max_cpu_time : `float`
+        The cap on the process CPU time spent while profiling. (Seconds)
+    log : `logging.Logger` or `None`
+        The logger to use. If `None`, create one.
+
+    Attributes
+    ----------
+    output_dir : `pathlib.Path`
+        The directory the results are written to.
+    cycles_remaining : `int`
+        The number of cycles still to be profiled.
+    max_cpu_time : `float`
+        The cap on the process CPU time spent while profiling. (Seconds)
+    cpu_time : `float`
+        The process CPU time spent while profiling so far. (Seconds)
+    """
+
+    def __init__(
+        self,
+        output_dir: str | pathlib.Path,
+        cycles: int = 0,
+        max_cpu_time: float = 60,
+        log: logging.Logger | None = None,
+    ) -> None:
+        self.output_dir: pathlib.Path = pathlib.Path(output_dir)
+        self.cycles_remaining: int = cycles
+        self.max_cpu_time: float = max_cpu_time
+        self.cpu_time: float = 0
+        self.log: logging.Logger = log if log is not None else logging.getLogger(__name__)
+
+    @property
+    def active(self) -> bool:
+        """Is profiling of further cycles requested?"""
+        return self.cycles_remaining > 0
+
+    @contextlib.contextmanager
+    def profile_cycle(self) -> typing.Iterator[None]:
+        """Profile the enclosed code as one cycle, if profiling is active."""
+        if not self.active:
+            yield
+            return
+
+        t0 = time.process_time()
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        started_tracemalloc = not tracemalloc.is_tracing()
+        if started_tracemalloc:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        snapshot_before = tracemalloc.take_snapshot()
+        snapshot_after: tracemalloc.Snapshot | None = None
+        cycle_cpu_time: float | None = None
+        profile = cProfile.Profile()
+
+        def stop() -> None:
+            nonlocal snapshot_after, cycle_cpu_time
+            if cycle_cpu_time is not None:
+                return
+            profile.disable()
+            snapshot_after = tracemalloc.take_snapshot()
+            if started_tracemalloc:
+                tracemalloc.stop()
+            cycle_cpu_time = time.process_time() - t0
+
+        def check_cpu_time() -> None:
+            nonlocal check_handle
+            if cycle_cpu_time is not None:
+                return
+            if self.cpu_time + time.process_time() - t0 > self.max_cpu_time:
+                self.log.warning(f"Profiling reached the {self.max_cpu_time} s CPU time cap; stopping.")
+                stop()
+            else:
+                check_handle = loop.call_later(CHECK_INTERVAL, check_cpu_time)
+
+        try:
+            loop: asyncio.AbstractEventLoop | None = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        check_handle: asyncio.TimerHandle | None = None
+        profile.enable()
+        if loop is not None:
+            check_handle = loop.call_later(CHECK_INTERVAL, check_cpu_time)
+        try:
+            yield
+        finally:
+            stop()
+            if check_handle is not None:
+                check_handle.cancel()
+            assert snapshot_after is not None and cycle_cpu_time is not None
+            self.cycles_remaining -= 1
+            t_write = time.process_time()
+            try:
+                self.write_results(profile, snapshot_before, snapshot_after, cycle_cpu_time)
+            except Exception:
+                self.log.exception("Failed to write profiling results.")
+            self.cpu_time += cycle_cpu_time + time.process_time() - t_write
+            if self.active and self.cpu_time >= self.max_cpu_time:
+                self.log.warning(
+                    f"Profiling used {self.cpu_time:0.1f} s of process CPU time, "
+                    f"reaching the {self.max_cpu_time} s cap; skipping the remaining "
+                    f"{self.cycles_remaining} cycles."
+                )
+                self.cycles_remaining = 0
+
+    def write_results(
+        self,
+        profile: cProfile.Profile,
+        snapshot_before: tracemalloc.Snapshot,
+        snapshot_after: tracemalloc.Snapshot,
+        cycle_cpu_time: float,
+    ) -> None:
+        """Write the results of one profiled cycle.
+
+        Parameters
+        ----------
+        profile : `cProfile.Profile`
+            The CPU profile of the cycle.
+        snapshot_before : `tracemalloc.Snapshot`
+            The allocation snapshot taken at the start of the cycle.
+        snapshot_after : `tracemalloc.Snapshot`
+            The allocation snapshot taken at the end of the cycle.
+        cycle_cpu_time : `float`
+            The process CPU time of the cycle, including the allocation
+            snapshots. (Seconds)
+        """
+        stem = datetime.datetime.now(tz=datetime.timezone.utc).strftime("cycle-%Y%m%dT%H%M%S.%f")
+        profile.dump_stats(self.output_dir / f"{stem}.prof")
+        stats = snapshot_after.compare_to(snapshot_before, "lineno")
+        with open(self.output_dir / f"{stem}.txt", "w") as f:
+            f.write(f"Process CPU time during the cycle: {cycle_cpu_time:0.3f} s\n")
+            f.write(f"Top {TOP_ALLOCATIONS} allocation differences:\n")
+            for stat in stats[:TOP_ALLOCATIONS]:
+                f.write(f"{stat}\n")
+        self.log.info(f"Wrote profile of telemetry cycle to {self.output_dir / stem}.*")
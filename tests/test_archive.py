@@ -0,0 +1,114 @@
+# This file is part of ts_weatherforecast.
+#
+# Developed for the Vera C. Rubin Observatory Telescope and Site Systems.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import datetime
+import json
+import pathlib
+import tempfile
+import unittest
+from zoneinfo import ZoneInfo
+
+from lsst.ts import weatherforecast
+from pytest import approx
+
+TEST_FILE = pathlib.Path("python/lsst/ts/weatherforecast/data/forecast-test.json")
+
+
+class ForecastArchiveTestCase(unittest.TestCase):
+    """Test the columnar forecast archive."""
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.archive = weatherforecast.ForecastArchive(self.tmp_dir.name)
+        with open(TEST_FILE) as f:
+            self.response = json.load(f)
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def write_run(self, modelrun_utc: str) -> pathlib.Path:
+        metadata = dict(self.response["metadata"], modelrun_utc=modelrun_utc)
+        trends = []
+        for name in ("trend_1h", "trend_day"):
+            trend = dict(self.response[name])
+            trend["time"] = [
+                datetime.datetime.strptime(value, "%Y-%m-%d %H:%M")
+                .replace(tzinfo=ZoneInfo("America/Santiago"))
+                .timestamp()
+                for value in trend["time"]
+            ]
+            trends.append(trend)
+        return self.archive.write(metadata, *trends)
+
+    def test_write(self) -> None:
+        run_dir = self.write_run("2022-09-13 00:00")
+        assert run_dir == pathlib.Path(self.tmp_dir.name, "2022-09-13", "0000")
+        for name in ("metadata.json", "hourly.npy", "daily.npy"):
+            assert (run_dir / name).exists()
+        # Rewriting the same model run replaces it.
+        self.response["trend_1h"]["temperature"][0] = 99.0
+        self.write_run("2022-09-13 00:00")
+        assert list(run_dir.parent.iterdir()) == [run_dir]
+        modelrun = self.archive.parse_modelrun("2022-09-13 00:00").timestamp()
+        result = self.archive.query(modelrun, modelrun, fields=["temperature"])
+        assert result["temperature"][0, 3] == 99.0
+
+    def test_list_runs(self) -> None:
+        run_dir = self.write_run("2022-09-13 00:00")
+        # Stray files and directories are ignored.
+        root = pathlib.Path(self.tmp_dir.name)
+        (root / "2022-09-13.txt").touch()
+        (root / "2022-09-13-copy" / "0000").mkdir(parents=True)
+        (root / "2022-09-13" / "README").touch()
+        (root / "2022-09-13" / "0000-copy").mkdir()
+        (root / "2022-09-13" / ".old-abc").mkdir()
+        assert self.archive.list_runs(0, 2e9) == [run_dir]
+
+    def test_query(self) -> None:
+        for modelrun_utc in ("2022-09-12 12:00", "2022-09-13 00:00", "2022-09-13 12:00"):
+            self.write_run(modelrun_utc)
+        modelrun = self.archive.parse_modelrun("2022-09-13 00:00").timestamp()
+
+        result = self.archive.query(
+            modelrun, modelrun + 12 * 3600, lead_min=3, lead_max=26, fields=["temperature"]
+        )
+        assert result["modelrun"] == approx([modelrun, modelrun + 12 * 3600])
+        assert list(result["lead"]) == list(range(3, 27))
+        assert result["temperature"].shape == (2, 24)
+        # The first hourly value of the test file is local midnight,
+        # three hours after the 00 UTC model run.
+        assert result["temperature"][0] == approx(self.response["trend_1h"]["temperature"][:24])
+        assert result["time"][0, 0] == approx(modelrun + 3 * 3600)
+
+        daily = self.archive.query(modelrun, modelrun, lead_max=2, fields=["temperature_max"], trend="daily")
+        assert daily["temperature_max"][0] == approx(self.response["trend_day"]["temperature_max"][:3])
+
+    def test_query_empty(self) -> None:
+        result = self.archive.query(0, 1)
+        assert result["modelrun"].size == 0
+        assert result["time"].shape == (0, 1)
+
+    def test_query_bad_arguments(self) -> None:
+        self.write_run("2022-09-13 00:00")
+        with self.assertRaises(ValueError):
+            self.archive.query(0, 2e9, trend="weekly")
+        with self.assertRaises(ValueError):
+            self.archive.query(0, 2e9, fields=["not_a_field"])
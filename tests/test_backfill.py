@@ -0,0 +1,227 @@
+# This file is part of ts_weatherforecast.
+#
+# Developed for the Vera C. Rubin Observatory Telescope and Site Systems.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import asyncio
+import datetime
+import pathlib
+import tempfile
+import types
+import typing
+import unittest
+
+import numpy as np
+from aiohttp import web
+from lsst.ts import weatherforecast
+from pytest import approx
+
+START = datetime.datetime(2022, 9, 12, tzinfo=datetime.timezone.utc)
+END = datetime.datetime(2022, 9, 13, 12, tzinfo=datetime.timezone.utc)
+SITES = [
+    weatherforecast.Site("CerroPachon"),
+    weatherforecast.Site.from_string("LaSerena=-29.9,-71.25,30"),
+]
+
+
+class SlowMockServer(weatherforecast.mock_server.MockServer):
+    """Answer the requests for later model runs first."""
+
+    async def get_forecast(self, request: web.Request) -> web.Response:
+        modelrun = datetime.datetime.strptime(request.query["modelrun"], "%Y-%m-%d %H:%M")
+        await asyncio.sleep(0.05 * (END.replace(tzinfo=None) - modelrun) / datetime.timedelta(hours=12))
+        return await super().get_forecast(request)
+
+
+class MockTopic:
+    """Record the data written to a telemetry topic."""
+
+    def __init__(self, written: list) -> None:
+        self.written = written
+
+    async def set_write(self, **kwargs: typing.Any) -> None:
+        self.written.append(kwargs)
+
+
+class BackfillTestCase(unittest.IsolatedAsyncioTestCase):
+    """Test the historical backfill against the mock server."""
+
+    async def asyncSetUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.root = pathlib.Path(self.tmp_dir.name)
+        self.mock_server = weatherforecast.mock_server.MockServer()
+        await self.mock_server.start()
+
+    async def asyncTearDown(self) -> None:
+        await self.mock_server.cleanup()
+        self.tmp_dir.cleanup()
+
+    def make_backfill(self, **kwargs: object) -> weatherforecast.Backfill:
+        arguments: dict = dict(
+            site_url=self.mock_server.url,
+            api_key="test",
+            sites=SITES,
+            start=START,
+            end=END,
+            progress_file=self.root / "progress.txt",
+            request_url=weatherforecast.forecast.REQUEST_URL,
+            modelrun_param="modelrun",
+            archive_dir=self.root / "archive",
+            max_concurrency=2,
+        )
+        arguments.update(kwargs)
+        return weatherforecast.Backfill(**arguments)
+
+    def read_progress(self) -> list[str]:
+        with open(self.root / "progress.txt") as f:
+            return f.read().splitlines()
+
+    async def test_backfill(self) -> None:
+        backfill = self.make_backfill()
+        assert await backfill.run() == 8
+        assert self.mock_server.request_count == 8
+        assert backfill.failed == 0
+
+        for site in SITES:
+            archive = weatherforecast.ForecastArchive(self.root / "archive" / site.name)
+            result = archive.query(START.timestamp(), END.timestamp(), lead_max=23, fields=["temperature"])
+            assert result["modelrun"].tolist() == [
+                (START + datetime.timedelta(hours=12 * i)).timestamp() for i in range(4)
+            ]
+            assert result["temperature"].shape == (4, 24)
+
+        assert len(self.read_progress()) == 8
+
+        # Everything is done, so running again makes no requests.
+        assert await self.make_backfill().run() == 0
+        assert self.mock_server.request_count == 8
+
+    async def test_interrupted_progress(self) -> None:
+        with open(self.root / "progress.txt", "w") as f:
+            f.write("CerroPachon/2022-09-12 00:00\nLaSerena/2022-09-1")
+        backfill = self.make_backfill()
+        assert await backfill.run() == 7
+        # The partial line is dropped and every key is on its own line.
+        progress = self.read_progress()
+        assert len(progress) == 8
+        assert set(progress) == backfill.done
+
+    async def test_credit_budget(self) -> None:
+        backfill = self.make_backfill(credit_budget=10, credits_per_request=3)
+        assert await backfill.run() == 3
+        assert backfill.credits_used == 9
+
+        # Resume with a new budget.
+        backfill = self.make_backfill(credit_budget=100, credits_per_request=3)
+        assert await backfill.run() == 5
+        assert self.mock_server.request_count == 8
+
+    async def test_wrong_modelrun(self) -> None:
+        # The mock server ignores this parameter and always returns its
+        # canned 2022-09-13 00:00 model run; only that request may count
+        # as a backfilled gap.
+        backfill = self.make_backfill(modelrun_param="run")
+        assert await backfill.run() == 2
+        assert backfill.failed == 6
+        assert sorted(self.read_progress()) == ["CerroPachon/2022-09-13 00:00", "LaSerena/2022-09-13 00:00"]
+        assert [path.name for path in (self.root / "archive" / "CerroPachon").iterdir()] == ["2022-09-13"]
+
+    async def test_replay_order(self) -> None:
+        await self.mock_server.cleanup()
+        self.mock_server = SlowMockServer()
+        await self.mock_server.start()
+        written: list = []
+        controller = types.SimpleNamespace(
+            tel_metadata=MockTopic(written),
+            tel_hourlyTrend=MockTopic([]),
+            tel_dailyTrend=MockTopic([]),
+        )
+        backfill = self.make_backfill(
+            sites=SITES[:1], archive_dir=None, controller=controller, max_concurrency=4
+        )
+        assert await backfill.run() == 4
+        modelruns = [float(data["modelrun"]) for data in written]
+        assert len(modelruns) == 4
+        assert modelruns == sorted(modelruns)
+        assert len(self.read_progress()) == 4
+
+    async def test_replay_gap_fill(self) -> None:
+        await self.mock_server.cleanup()
+        self.mock_server = weatherforecast.mock_server.MockServer(
+            data="python/lsst/ts/weatherforecast/data/forecast-missing.json"
+        )
+        await self.mock_server.start()
+        hourly: list = []
+        controller = types.SimpleNamespace(
+            tel_metadata=MockTopic([]),
+            tel_hourlyTrend=MockTopic(hourly),
+            tel_dailyTrend=MockTopic([]),
+        )
+        backfill = self.make_backfill(
+            sites=SITES[:1], controller=controller, gap_fill_max_hours=3, gap_fill_max_days=1
+        )
+        assert await backfill.run() == 4
+        assert hourly[0]["windDirection"][9:12] == approx([107, 25.5, 304])
+        assert hourly[0]["pictocode"][3:6] == [4, 4, 4]
+        # Gaps longer than gap_fill_max_hours are not filled.
+        assert np.isnan(hourly[0]["windspeed"][38:43]).all()
+
+        # The archive keeps the trends as received.
+        archive = weatherforecast.ForecastArchive(self.root / "archive" / "CerroPachon")
+        modelrun = datetime.datetime(2022, 9, 13, tzinfo=datetime.timezone.utc).timestamp()
+        result = archive.query(modelrun, modelrun, fields=["winddirection", "pictocode"])
+        times = result["time"][0]
+        winddirection_gap = times == hourly[0]["timestamp"][10]
+        pictocode_gap = np.isin(times, hourly[0]["timestamp"][4:6])
+        assert winddirection_gap.sum() == 1 and pictocode_gap.sum() == 2
+        assert np.isnan(result["winddirection"][0, winddirection_gap]).all()
+        assert np.isnan(result["pictocode"][0, pictocode_gap]).all()
+
+    async def test_failed_requests(self) -> None:
+        self.mock_server.bad_request = True
+        backfill = self.make_backfill()
+        assert await backfill.run() == 0
+        assert backfill.failed == 8
+        assert not (self.root / "progress.txt").exists()
+
+    def test_bad_arguments(self) -> None:
+        with self.assertRaises(ValueError):
+            weatherforecast.Site.from_string("LaSerena")
+        with self.assertRaises(ValueError):
+            self.make_backfill(archive_dir=None)
+        with self.assertRaises(ValueError):
+            self.make_backfill(max_concurrency=0)
+        with self.assertRaises(ValueError):
+            self.make_backfill(start=START + datetime.timedelta(hours=3))
+        self.make_backfill(start=START + datetime.timedelta(hours=12))
+        self.make_backfill(start=START + datetime.timedelta(hours=3), interval=3)
+
+    def test_parse_time(self) -> None:
+        assert weatherforecast.backfill.parse_time("2022-09-13") == datetime.datetime(
+            2022, 9, 13, tzinfo=datetime.timezone.utc
+        )
+        assert weatherforecast.backfill.parse_time("2022-09-13T12:00-03:00") == datetime.datetime(
+            2022, 9, 13, 15, tzinfo=datetime.timezone.utc
+        )
+        # A date-only end includes every model run of that day.
+        end = weatherforecast.backfill.parse_end_time("2022-09-13")
+        assert END < end < datetime.datetime(2022, 9, 14, tzinfo=datetime.timezone.utc)
+        assert weatherforecast.backfill.parse_end_time("2022-09-13T00:00") == END - datetime.timedelta(
+            hours=12
+        )
@@ -19,15 +19,23 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+import asyncio
 import datetime
 import json
+import math
 import os
 import pathlib
 import re
+import shutil
+import tempfile
 import unittest
 import typing
+from unittest import mock
 from zoneinfo import ZoneInfo
 
+import aiohttp
+import numpy as np
+import yaml
 from lsst.ts import salobj, weatherforecast
 from pytest import approx
 
@@ -49,14 +57,26 @@ class WeatherForecastCSCTestCase(salobj.BaseCscTestCase, unittest.IsolatedAsynci
         initial_state: salobj.State,
         config_dir: pathlib.Path = TEST_CONFIG_DIR,
         simulation_mode: int = 1,
+        override: str = "",
         **kwargs: typing.Any,
     ) -> weatherforecast.csc.WeatherForecastCSC:
         return weatherforecast.csc.WeatherForecastCSC(
             initial_state=initial_state,
             simulation_mode=simulation_mode,
             config_dir=config_dir,
+            override=override,
         )
 
+    def make_config_dir(self, root: str, **config: typing.Any) -> pathlib.Path:
+        """Copy the test configuration to ``root`` with an ``override.yaml``
+        file that sets ``config``.
+        """
+        config_dir = pathlib.Path(root) / "config"
+        shutil.copytree(TEST_CONFIG_DIR, config_dir)
+        with open(config_dir / "override.yaml", "w") as f:
+            yaml.safe_dump(config, f)
+        return config_dir
+
     async def test_bin_script(self) -> None:
         await self.check_bin_script(name="WeatherForecast", index=False, exe_name="run_weatherforecast")
 
@@ -65,8 +85,124 @@ class WeatherForecastCSCTestCase(salobj.BaseCscTestCase, unittest.IsolatedAsynci
             initial_state=salobj.State.ENABLED,
             simulation_mode=2,
             config_dir=TEST_CONFIG_DIR,
+            override="gap_fill.yaml",
         ):
-            await self.assert_next_sample(topic=self.remote.tel_hourlyTrend)
+            hourly_trend = await self.assert_next_sample(topic=self.remote.tel_hourlyTrend, timeout=TIMEOUT)
+            # The gap in windDirection crosses north.
+            assert hourly_trend.windDirection[9:12] == approx([107, 25.5, 304])
+            assert list(hourly_trend.pictocode[3:6]) == [4, 4, 4]
+            assert hourly_trend.temperature[9:13] == approx([3.07, 3.76, 4.46, 5.15], abs=0.01)
+            # Gaps longer than gap_fill_max_hours are published as NaN.
+            assert all(math.isnan(value) for value in hourly_trend.windspeed[38:43])
+
+    async def test_archive(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            archive_dir = pathlib.Path(tmp_dir, "archive")
+            config_dir = self.make_config_dir(
+                tmp_dir, archive_dir=str(archive_dir), gap_fill_max_hours=3, gap_fill_max_days=1
+            )
+            async with self.make_csc(
+                initial_state=salobj.State.ENABLED,
+                simulation_mode=2,
+                config_dir=config_dir,
+                override="override.yaml",
+            ):
+                hourly_trend = await self.assert_next_sample(
+                    topic=self.remote.tel_hourlyTrend, timeout=TIMEOUT
+                )
+                # The forecast is archived in a thread once published.
+                run_dir = archive_dir / "2022-09-13" / "0000"
+                for _ in range(100):
+                    if (run_dir / "metadata.json").exists():
+                        break
+                    await asyncio.sleep(0.1)
+                assert (run_dir / "metadata.json").exists()
+
+                # The archive keeps the values as received, not as filled.
+                archive = weatherforecast.ForecastArchive(archive_dir)
+                modelrun = archive.parse_modelrun("2022-09-13 00:00").timestamp()
+                result = archive.query(modelrun, modelrun, fields=["winddirection", "pictocode"])
+                times = result["time"][0]
+                winddirection_gap = times == hourly_trend.timestamp[10]
+                pictocode_gap = np.isin(times, hourly_trend.timestamp[4:6])
+                assert winddirection_gap.sum() == 1 and pictocode_gap.sum() == 2
+                assert hourly_trend.windDirection[10] == approx(25.5)
+                assert np.isnan(result["winddirection"][0, winddirection_gap]).all()
+                assert np.isnan(result["pictocode"][0, pictocode_gap]).all()
+
+    async def check_profiling(self, expected_cycles: int, **config: typing.Any) -> None:
+        """Check that the first forecast update is profiled as configured.
+
+        Parameters
+        ----------
+        expected_cycles : `int`
+            The number of updates the CSC should profile.
+        config : `dict`
+            Configuration to override.
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            profile_dir = pathlib.Path(tmp_dir, "profiles")
+            config_dir = self.make_config_dir(tmp_dir, profile_dir=str(profile_dir), **config)
+            async with self.make_csc(
+                initial_state=salobj.State.ENABLED,
+                simulation_mode=1,
+                config_dir=config_dir,
+                override="override.yaml",
+            ):
+                await self.assert_next_sample(topic=self.remote.tel_hourlyTrend, timeout=TIMEOUT)
+                # The results are written when the profiled update ends.
+                for _ in range(100):
+                    if list(profile_dir.glob("*.txt")):
+                        break
+                    await asyncio.sleep(0.1)
+                assert len(list(profile_dir.glob("*.prof"))) == 1
+                assert len(list(profile_dir.glob("*.txt"))) == 1
+                assert self.csc.profiler.cycles_remaining == expected_cycles - 1
+
+    async def test_profiling(self) -> None:
+        await self.check_profiling(expected_cycles=2, profile_cycles=2)
+
+    async def test_profiling_env(self) -> None:
+        with mock.patch.dict(os.environ, {weatherforecast.PROFILE_CYCLES_ENV: "3"}):
+            await self.check_profiling(expected_cycles=3)
+
+    async def test_profiling_bad_env(self) -> None:
+        # An invalid value is ignored rather than failing configure.
+        with mock.patch.dict(os.environ, {weatherforecast.PROFILE_CYCLES_ENV: "all"}):
+            await self.check_profiling(expected_cycles=1, profile_cycles=1)
+
+    async def test_forecast_server(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            config_dir = self.make_config_dir(tmp_dir, http_port=0)
+            async with self.make_csc(
+                initial_state=salobj.State.ENABLED,
+                simulation_mode=1,
+                config_dir=config_dir,
+                override="override.yaml",
+            ):
+                metadata = await self.assert_next_sample(topic=self.remote.tel_metadata, timeout=TIMEOUT)
+                await self.assert_next_sample(topic=self.remote.tel_hourlyTrend)
+                assert self.csc.forecast_server is not None
+                url = self.csc.forecast_server.url
+                async with aiohttp.ClientSession(url) as session:
+                    # The server is updated once the forecast is published.
+                    summary: dict = {}
+                    for _ in range(100):
+                        async with session.get("/summary") as resp:
+                            if resp.status == 200:
+                                summary = await resp.json()
+                                break
+                        await asyncio.sleep(0.1)
+                    assert summary["modelrun_utc"] == "2022-09-13 00:00"
+                    async with session.get("/forecast") as resp:
+                        assert resp.status == 200
+                        forecast = await resp.json()
+                    assert forecast["metadata"]["latitude"] == approx(metadata.latitude)
+
+                    await salobj.set_summary_state(self.remote, salobj.State.STANDBY)
+                    with self.assertRaises(aiohttp.ClientConnectionError):
+                        async with session.get("/summary"):
+                            pass
 
     async def test_bad_request(self) -> None:
         async with self.make_csc(
@@ -0,0 +1,113 @@
+# This file is part of ts_weatherforecast.
+#
+# Developed for the Vera C. Rubin Observatory Telescope and Site Systems.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import json
+import math
+import pathlib
+import unittest
+
+import aiohttp
+from lsst.ts import weatherforecast
+from pytest import approx
+
+TEST_FILE = pathlib.Path("python/lsst/ts/weatherforecast/data/forecast-test.json")
+
+
+class ForecastServerTestCase(unittest.IsolatedAsyncioTestCase):
+    """Test the local forecast query endpoint."""
+
+    async def asyncSetUp(self) -> None:
+        self.server = weatherforecast.ForecastServer()
+        await self.server.start()
+        self.session = aiohttp.ClientSession(self.server.url)
+        with open(TEST_FILE) as f:
+            self.decoded = weatherforecast.decode_forecast(json.load(f))
+
+    async def asyncTearDown(self) -> None:
+        await self.session.close()
+        await self.server.cleanup()
+
+    async def test_no_forecast(self) -> None:
+        async with self.session.get("/forecast") as resp:
+            assert resp.status == 503
+
+    async def test_port_in_use(self) -> None:
+        port = int(self.server.url.rsplit(":", 1)[1])
+        server = weatherforecast.ForecastServer(port=port)
+        with self.assertRaises(OSError):
+            await server.start()
+        await server.cleanup()
+
+    async def test_forecast(self) -> None:
+        self.decoded["trend_1h"]["temperature"][0] = math.nan
+        self.server.update(self.decoded)
+        async with self.session.get("/forecast") as resp:
+            assert resp.status == 200
+            assert resp.headers["Content-Encoding"] == "gzip"
+            forecast = await resp.json()
+        assert forecast["metadata"] == self.decoded["metadata"]
+        assert forecast["trend_1h"]["temperature"][0] is None
+        assert forecast["trend_1h"]["time"] == approx(self.decoded["trend_1h"]["time"])
+
+        async with self.session.get("/forecast", headers={"Accept-Encoding": "identity"}) as resp:
+            assert resp.status == 200
+            assert "Content-Encoding" not in resp.headers
+            assert await resp.json() == forecast
+
+    async def test_accept_encoding(self) -> None:
+        self.server.update(self.decoded)
+        for accept_encoding, gzipped in (
+            ("gzip;q=0", False),
+            ("gzip; q=0.0, identity", False),
+            ("deflate, gzip;q=0.5", True),
+            ("*;q=0.1", True),
+            ("*, gzip;q=0", False),
+            ("gzip;q=bad", False),
+        ):
+            with self.subTest(accept_encoding=accept_encoding):
+                async with self.session.get("/summary", headers={"Accept-Encoding": accept_encoding}) as resp:
+                    assert resp.status == 200
+                    assert (resp.headers.get("Content-Encoding") == "gzip") == gzipped
+                    assert (await resp.json())["modelrun_utc"] == "2022-09-13 00:00"
+
+    async def test_etag(self) -> None:
+        self.server.update(self.decoded)
+        async with self.session.get("/summary") as resp:
+            etag = resp.headers["ETag"]
+            summary = await resp.json()
+        assert summary["modelrun_utc"] == "2022-09-13 00:00"
+        temperature = self.decoded["trend_1h"]["temperature"]
+        assert summary["next_24h"]["temperature_max"] == approx(max(temperature[:24]))
+
+        async with self.session.get("/summary", headers={"If-None-Match": etag}) as resp:
+            assert resp.status == 304
+            assert await resp.read() == b""
+
+        # If-None-Match uses the weak comparison.
+        async with self.session.get("/summary", headers={"If-None-Match": f'"other", W/{etag}'}) as resp:
+            assert resp.status == 304
+
+        # A new forecast changes the ETag.
+        self.decoded["metadata"]["modelrun_utc"] = "2022-09-13 12:00"
+        self.server.update(self.decoded)
+        async with self.session.get("/summary", headers={"If-None-Match": etag}) as resp:
+            assert resp.status == 200
+            assert resp.headers["ETag"] != etag
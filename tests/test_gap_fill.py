@@ -0,0 +1,155 @@
+# This file is part of ts_weatherforecast.
+#
+# Developed for the Vera C. Rubin Observatory Telescope and Site Systems.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import math
+import time
+import unittest
+
+import numpy as np
+from lsst.ts import weatherforecast
+from pytest import approx
+
+nan = math.nan
+
+
+def reference_fill(values: list[float], max_gap: int, kind: str) -> list[float]:
+    """Fill gaps one value at a time, to check `fill_gaps` against."""
+    filled = list(values)
+    i = 0
+    while i < len(values):
+        if not math.isnan(values[i]):
+            i += 1
+            continue
+        j = i
+        while j < len(values) and math.isnan(values[j]):
+            j += 1
+        if i > 0 and j - i <= max_gap:
+            for k in range(i, j):
+                if kind == "previous":
+                    filled[k] = values[i - 1]
+                elif j < len(values):
+                    weight = (k - i + 1) / (j - i + 1)
+                    if kind == "circular":
+                        difference = (values[j] - values[i - 1] + 180) % 360 - 180
+                        filled[k] = (values[i - 1] + weight * difference) % 360
+                    else:
+                        filled[k] = values[i - 1] + weight * (values[j] - values[i - 1])
+        i = j
+    return filled
+
+
+class GapFillTestCase(unittest.TestCase):
+    """Test filling gaps in forecast trends."""
+
+    def test_linear(self) -> None:
+        filled, mask = weatherforecast.fill_gaps(np.array([nan, 1, nan, nan, 4, nan, nan, nan, 8, nan]), 2)
+        assert filled == approx([nan, 1, 2, 3, 4, nan, nan, nan, 8, nan], nan_ok=True)
+        assert mask.tolist() == [False, False, True, True, False, False, False, False, False, False]
+
+    def test_circular(self) -> None:
+        filled, mask = weatherforecast.fill_gaps(np.array([350, nan, 10, nan, 0]), 1, "circular")
+        assert filled == approx([350, 0, 10, 5, 0])
+        assert mask.sum() == 2
+
+    def test_previous(self) -> None:
+        filled, mask = weatherforecast.fill_gaps(np.array([nan, 3, nan, 7, nan, nan, nan]), 3, "previous")
+        assert filled == approx([nan, 3, 3, 7, 7, 7, 7], nan_ok=True)
+        assert mask.sum() == 4
+
+    def test_bad_kind(self) -> None:
+        with self.assertRaises(ValueError):
+            weatherforecast.fill_gaps(np.array([1.0, nan, 2.0]), 1, "cubic")
+
+    def test_fill_forecast_gaps(self) -> None:
+        decoded = {
+            "metadata": {},
+            "trend_1h": {
+                "time": [0, 3600, 7200, 10800],
+                "temperature": [1.0, nan, nan, 4.0],
+                "winddirection": [340, nan, 20, 30],
+                "pictocode": [1, None, 22, None],
+                "windspeed": [1.0, 2.0, 3.0, 4.0],
+            },
+            "trend_day": {"time": [0, 86400], "pictocode": [4, 4]},
+        }
+        windspeed = decoded["trend_1h"]["windspeed"]
+        unfilled = dict(decoded["trend_1h"])
+        fill_counts = weatherforecast.fill_forecast_gaps(decoded, max_hours=2, max_days=1)
+        assert fill_counts == {
+            "trend_1h": {"temperature": 2, "winddirection": 1, "pictocode": 2},
+            "trend_day": {},
+        }
+        assert decoded["fill_counts"] is fill_counts
+        hourly = decoded["trend_1h"]
+        assert hourly["temperature"] == approx([1, 2, 3, 4])
+        assert hourly["winddirection"] == approx([340, 0, 20, 30])
+        assert hourly["pictocode"] == [1, 1, 22, 22]
+        assert all(isinstance(value, int) for value in hourly["pictocode"])
+        assert hourly["windspeed"] is windspeed
+        # A shallow copy keeps the values as received, for the archive.
+        assert unfilled["temperature"] == approx([1, nan, nan, 4], nan_ok=True)
+
+    def test_integer_fields(self) -> None:
+        trend: dict[str, list] = {
+            "predictability_class": [3, None, 4],
+            "precipitation_probability": [10, None, 15, None, None],
+            "relativehumidity": [10, None, 15],
+            "temperature": [10.0, nan, 15.0],
+        }
+        weatherforecast.fill_trend_gaps(trend, 1)
+        assert trend["predictability_class"] == [3, 3, 4]
+        assert trend["precipitation_probability"] == approx([10, 12, 15, nan, nan], nan_ok=True)
+        assert all(type(value) is int for value in trend["precipitation_probability"][:3])
+        # Only the declared integer fields are rounded.
+        assert trend["relativehumidity"] == approx([10, 12.5, 15])
+        assert trend["temperature"] == approx([10, 12.5, 15])
+
+    def test_large_payload(self) -> None:
+        """Check and time a large payload with most values missing."""
+        rng = np.random.default_rng(42)
+        n_fields, n_values, max_gap = 30, 20000, 6
+        trend: dict[str, list] = {"time": list(range(n_values))}
+        for i in range(n_fields):
+            values = rng.uniform(0, 360, n_values)
+            values[rng.random(n_values) < 0.6] = nan
+            trend[f"field{i}"] = values.tolist()
+        trend["winddirection"] = trend.pop("field0")
+        trend["pictocode"] = [nan if math.isnan(value) else int(value) for value in trend.pop("field1")]
+        expected = {
+            name: reference_fill(
+                values,
+                max_gap,
+                {"winddirection": "circular", "pictocode": "previous"}.get(name, "linear"),
+            )
+            for name, values in trend.items()
+            if name != "time"
+        }
+
+        t0 = time.perf_counter()
+        fill_counts = weatherforecast.fill_trend_gaps(trend, max_gap)
+        duration = time.perf_counter() - t0
+
+        for name, values in expected.items():
+            assert trend[name] == approx(values, nan_ok=True)
+            assert fill_counts[name] > 0
+        # Filling 600000 values takes about 0.1 s; the bound leaves
+        # plenty of margin for slow test machines.
+        assert duration < 2
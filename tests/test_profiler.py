@@ -0,0 +1,99 @@
+# This file is part of ts_weatherforecast.
+#
+# Developed for the Vera C. Rubin Observatory Telescope and Site Systems.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import asyncio
+import pathlib
+import tempfile
+import time
+import typing
+import unittest
+
+from lsst.ts import weatherforecast
+
+
+class TelemetryProfilerTestCase(unittest.TestCase):
+    """Test the telemetry loop profiler."""
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.output_dir = pathlib.Path(self.tmp_dir.name) / "profiles"
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def run_cycle(self, profiler: weatherforecast.TelemetryProfiler) -> list[int]:
+        with profiler.profile_cycle():
+            return [i**2 for i in range(10000)]
+
+    def test_disabled(self) -> None:
+        profiler = weatherforecast.TelemetryProfiler(self.output_dir)
+        assert not profiler.active
+        self.run_cycle(profiler)
+        assert not self.output_dir.exists()
+
+    def test_cycles(self) -> None:
+        profiler = weatherforecast.TelemetryProfiler(self.output_dir, cycles=2)
+        for _ in range(3):
+            self.run_cycle(profiler)
+        assert not profiler.active
+        assert len(list(self.output_dir.glob("*.prof"))) == 2
+        assert len(list(self.output_dir.glob("*.txt"))) == 2
+
+    def test_exception(self) -> None:
+        profiler = weatherforecast.TelemetryProfiler(self.output_dir, cycles=1)
+        with self.assertRaises(RuntimeError):
+            with profiler.profile_cycle():
+                raise RuntimeError("Failed cycle.")
+        assert len(list(self.output_dir.glob("*.prof"))) == 1
+
+    def test_overhead_counted(self) -> None:
+        class SlowWriteProfiler(weatherforecast.TelemetryProfiler):
+            def write_results(self, *args: typing.Any) -> None:
+                super().write_results(*args)
+                t0 = time.process_time()
+                while time.process_time() - t0 < 0.2:
+                    sum(range(10000))
+
+        profiler = SlowWriteProfiler(self.output_dir, cycles=2)
+        self.run_cycle(profiler)
+        # Writing the results counts towards the CPU time cap.
+        assert profiler.cpu_time >= 0.2
+
+    def test_max_cpu_time(self) -> None:
+        profiler = weatherforecast.TelemetryProfiler(self.output_dir, cycles=5, max_cpu_time=1e-9)
+        self.run_cycle(profiler)
+        assert not profiler.active
+        assert len(list(self.output_dir.glob("*.prof"))) == 1
+
+    def test_max_cpu_time_within_cycle(self) -> None:
+        async def long_cycle(profiler: weatherforecast.TelemetryProfiler) -> float:
+            with profiler.profile_cycle():
+                t0 = time.process_time()
+                while time.process_time() - t0 < 1:
+                    sum(range(10000))
+                    await asyncio.sleep(0)
+            return profiler.cpu_time
+
+        profiler = weatherforecast.TelemetryProfiler(self.output_dir, cycles=2, max_cpu_time=0.1)
+        # Profiling stops at the first check after the cap is reached,
+        # well before the cycle ends.
+        assert asyncio.run(long_cycle(profiler)) < 0.9
+        assert not profiler.active